@@ -0,0 +1 @@
+"""Benchmarks and fault-injection tools for the Jollymec integration."""
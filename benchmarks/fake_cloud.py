@@ -0,0 +1,143 @@
+"""Local stand-in for the efesto web2app endpoints used by hajolly.
+
+It implements the form login with its session cookie, the ajax endpoint
+(get-state, write-parameters-queue, heater-on, heater-off), the
+``status: 1`` reply for unknown sessions and the "Problèmes de
+communication" HTML page, with configurable latency.
+"""
+import asyncio
+import secrets
+from collections import Counter
+
+from aiohttp import web
+
+from custom_components.jollymec.hajolly import AJAX_PATH, LOGIN_PATH
+
+SESSION_COOKIE = "PHPSESSID"
+
+COMM_ERROR_PAGE = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+    "<title>Problèmes de communication</title></head>"
+    "<body><p>Problèmes de communication avec le poêle, réessayez plus tard.</p></body></html>"
+)
+
+
+def default_heater_state():
+    return {
+        'airTemperature': 19.5,
+        'smokeTemperature': 112,
+        'lastSetAirTemperature': 21,
+        'lastSetPower': 3,
+        'realPower': 3,
+        'deviceStatus': 7,
+        'isDeviceInAlarm': False,
+    }
+
+
+class FakeCloud(object):
+    """aiohttp application mimicking the efesto cloud.
+
+    ``latency`` is added to every reply. ``comm_errors`` makes the next
+    replies the communication error page; ``outage`` does the same for as
+    long as it is set. ``hang`` makes replies wait that many extra seconds.
+    ``expire_sessions`` forgets every session, so the next ajax call gets
+    ``status: 1``.
+    """
+
+    def __init__(self, heaters=(), latency=0.0, host="localhost", port=0):
+        self.heaters = {heater_id: default_heater_state() for heater_id in heaters}
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.comm_errors = 0
+        self.outage = False
+        self.hang = 0.0
+        self.requests = Counter()
+        self.sessions = set()
+        self._runner = None
+
+    @property
+    def url(self):
+        # aiohttp refuses cookies set by IP addresses, so use a host name
+        return "http://{}:{}".format(self.host, self.port)
+
+    @property
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    def expire_sessions(self):
+        self.sessions.clear()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(LOGIN_PATH, self._handle_login)
+        app.router.add_post(AJAX_PATH, self._handle_ajax)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _delay(self):
+        delay = self.latency + self.hang
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _comm_error(self):
+        if self.outage:
+            return True
+        if self.comm_errors > 0:
+            self.comm_errors -= 1
+            return True
+        return False
+
+    async def _handle_login(self, request):
+        self.requests['login'] += 1
+        await self._delay()
+        if self._comm_error():
+            return web.Response(text=COMM_ERROR_PAGE, content_type="text/html")
+        await request.post()
+        session_id = secrets.token_hex(16)
+        self.sessions.add(session_id)
+        response = web.Response(text="<html><title>Tableau de bord</title></html>", content_type="text/html")
+        response.set_cookie(SESSION_COOKIE, session_id, path="/")
+        return response
+
+    async def _handle_ajax(self, request):
+        data = await request.post()
+        method = data.get('method')
+        self.requests[method] += 1
+        await self._delay()
+        if self._comm_error():
+            return web.Response(text=COMM_ERROR_PAGE, content_type="text/html")
+        if request.cookies.get(SESSION_COOKIE) not in self.sessions:
+            return web.json_response({'status': 1, 'message': 'not logged in'})
+        state = self.heaters.get(data.get('device'))
+        if state is None:
+            return web.json_response({'status': 2, 'message': 'unknown device'})
+
+        if method == 'write-parameters-queue':
+            name, _, value = data.get('params', '').partition('=')
+            if name == 'set-power':
+                state['lastSetPower'] = int(value)
+            elif name == 'set-air-temperature':
+                state['lastSetAirTemperature'] = int(value)
+        elif method == 'heater-on':
+            state['deviceStatus'] = 1
+        elif method == 'heater-off':
+            state['deviceStatus'] = 0
+        elif method != 'get-state':
+            return web.json_response({'status': 2, 'message': 'unknown method'})
+        return web.json_response({'status': 0, 'message': state})
@@ -0,0 +1,245 @@
+"""Benchmark the Jollymec client and climate entity against the fake cloud.
+
+Run from the repository root:
+
+    python -m benchmarks.run --heaters 4 --polls 50 --latency 0.05
+
+Reports latency percentiles per operation, cloud requests per poll and
+poll throughput for the fleet. Like the integration itself, it needs a
+Home Assistant development environment.
+
+``--record FILE`` records the client traffic; ``--replay FILE`` runs the
+client part against such a recording (or one made with the integration's
+traffic_mode option) without the fake cloud or any network.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+
+from custom_components.jollymec import hajolly
+from custom_components.jollymec.transport import HttpTransport, RecordingTransport, ReplayTransport
+
+from .fake_cloud import FakeCloud
+
+USERNAME = "bench@example.com"
+PASSWORD = "bench"
+
+
+def percentiles(samples):
+    """p50/p90/p99/max of ``samples`` (seconds) in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = ordered[0]
+    return {
+        'count': len(ordered),
+        'p50_ms': p50 * 1000,
+        'p90_ms': p90 * 1000,
+        'p99_ms': p99 * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+class Recorder(object):
+    """Collects timings and request counts per operation."""
+
+    def __init__(self, count_requests):
+        self.count_requests = count_requests
+        self.results = {}
+
+    async def measure(self, name, coro_factory, repeat, per=1):
+        """Time ``repeat`` runs of ``coro_factory()``; ``per`` polls happen in each."""
+        samples = []
+        before = self.count_requests()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            await coro_factory()
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        result = percentiles(samples)
+        result['requests_per_op'] = (self.count_requests() - before) / (repeat * per)
+        result['ops_per_s'] = repeat * per / elapsed if elapsed else 0.0
+        self.results[name] = result
+        return result
+
+
+def heater_ids(count):
+    return ["BENCH{:02d}".format(index) for index in range(count)]
+
+
+async def bench_client(recorder, base_url, heaters, args, transport=None):
+    """Raw client and Device paths, without Home Assistant."""
+    # All heaters of an account share one client, as the integration does.
+    # No freshness window, back to back polls must reach the cloud.
+    client = hajolly.JollyMecClient(
+        None, USERNAME, PASSWORD, base_url=base_url, transport=transport, max_concurrency=args.concurrency,
+        state_max_age=0)
+    fleet = [hajolly.jollymec(USERNAME, PASSWORD, heater_id, client=client) for heater_id in heaters]
+    try:
+        await recorder.measure('login', client.async_login, 1)
+        for jolly in fleet:
+            await jolly.async_fetch_data()
+        device = fleet[0].devices[0]
+
+        await recorder.measure(
+            'client.get_state', lambda: client.async_get_state(heaters[0]), args.polls)
+
+        async def read_burst():
+            # Automations firing together, one request is expected
+            await asyncio.gather(*(client.async_get_state(heaters[0]) for _ in range(10)))
+        await recorder.measure('client.get_state_burst_10', read_burst, max(1, args.polls // 10))
+
+        await recorder.measure('device.update', device.async_update, args.polls)
+        await recorder.measure(
+            'device.set_air_temperature',
+            lambda: device.async_set_air_temperature(device.target_temperature or 20),
+            max(1, args.polls // 10))
+
+        async def slider():
+            await asyncio.gather(*(device.async_set_air_temperature(value) for value in range(15, 25)))
+
+        await recorder.measure('device.slider_burst_10', slider, 1)
+
+        async def poll_fleet():
+            await asyncio.gather(*(jolly.device.async_update() for jolly in fleet))
+
+        await recorder.measure('fleet.poll', poll_fleet, args.polls, per=len(fleet))
+    finally:
+        await client.async_close()
+
+
+async def bench_entity(recorder, cloud, args):
+    """Climate entity update and command paths inside a Home Assistant core."""
+    from homeassistant import bootstrap, config_entries, loader
+    from homeassistant.core import HomeAssistant
+    from homeassistant.setup import async_setup_component
+
+    from custom_components.jollymec.const import DATA_CLIENTS, DATA_COORDINATORS, DOMAIN
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+        hass.config_entries = config_entries.ConfigEntries(hass, {})
+        await bootstrap.async_load_base_functionality(hass)
+        await hass.async_start()
+
+        # The YAML platform always talks to the production URL
+        production_url = hajolly.baseurl
+        hajolly.baseurl = cloud.url
+        try:
+            heaters = heater_ids(args.heaters)
+            platforms = [
+                {
+                    'platform': DOMAIN,
+                    'name': 'bench {}'.format(index),
+                    'username': USERNAME,
+                    'password': PASSWORD,
+                    'id': heater_id,
+                    'max_concurrent_requests': args.concurrency,
+                    'target_temp': 20,
+                    'eco_temp': 18,
+                    'eco_pw': 1,
+                }
+                for index, heater_id in enumerate(heaters)
+            ]
+            assert await async_setup_component(hass, 'climate', {'climate': platforms})
+            await hass.async_block_till_done()
+
+            coordinators = list(hass.data[DOMAIN][DATA_COORDINATORS].values())
+            coordinator = coordinators[0]
+            # The first polls run in the background, don't measure them
+            while any(c.data is None for c in coordinators):
+                await asyncio.sleep(0.01)
+            # Back to back refreshes would be served from the freshness window
+            for client in hass.data[DOMAIN][DATA_CLIENTS].values():
+                client.state_max_age = 0
+            entity_id = 'climate.bench_0'
+
+            await recorder.measure('entity.update', coordinator.async_refresh, args.polls)
+
+            async def refresh_all():
+                await asyncio.gather(*(c.async_refresh() for c in coordinators))
+
+            await recorder.measure('entity.fleet_update', refresh_all, args.polls, per=len(coordinators))
+
+            async def set_temperature():
+                await hass.services.async_call(
+                    'climate', 'set_temperature', {'entity_id': entity_id, 'temperature': 19}, blocking=True)
+
+            await recorder.measure('entity.set_temperature', set_temperature, max(1, args.polls // 10))
+
+            async def set_preset():
+                await hass.services.async_call(
+                    'climate', 'set_preset_mode', {'entity_id': entity_id, 'preset_mode': 'eco'}, blocking=True)
+
+            await recorder.measure('entity.set_preset_mode', set_preset, max(1, args.polls // 10))
+        finally:
+            hajolly.baseurl = production_url
+            await hass.async_stop(force=True)
+
+
+def print_report(results, out=sys.stdout):
+    columns = ('count', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'requests_per_op', 'ops_per_s')
+    out.write("{:<28}".format('operation') + ''.join('{:>16}'.format(c) for c in columns) + "\n")
+    for name, result in results.items():
+        cells = []
+        for column in columns:
+            value = result.get(column, '')
+            cells.append('{:>16}'.format(value if isinstance(value, int) else '{:.2f}'.format(value)))
+        out.write("{:<28}".format(name) + ''.join(cells) + "\n")
+
+
+async def async_main(args):
+    if args.replay:
+        transport = ReplayTransport(args.replay).load()
+        recorder = Recorder(lambda: sum(transport.requests.values()))
+        await bench_client(recorder, None, transport.heaters, args, transport)
+        return recorder.results
+    async with FakeCloud(heater_ids(args.heaters), latency=args.latency) as cloud:
+        recorder = Recorder(lambda: cloud.total_requests)
+        transport = RecordingTransport(HttpTransport(), args.record) if args.record else None
+        try:
+            await bench_client(recorder, cloud.url, heater_ids(args.heaters), args, transport)
+        finally:
+            if transport is not None:
+                transport.close()
+        if not args.no_entity:
+            await bench_entity(recorder, cloud, args)
+    return recorder.results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heaters', type=int, default=1, help="number of heaters (default 1)")
+    parser.add_argument('--polls', type=int, default=50, help="polls per measured operation (default 50)")
+    parser.add_argument('--latency', type=float, default=0.02, help="added cloud latency in seconds (default 0.02)")
+    parser.add_argument('--concurrency', type=int, default=4, help="requests in flight per account (default 4)")
+    parser.add_argument('--no-entity', action='store_true', help="skip the Home Assistant climate entity part")
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+    traffic = parser.add_mutually_exclusive_group()
+    traffic.add_argument('--record', metavar='FILE', help="record the client traffic (.gz to compress)")
+    traffic.add_argument('--replay', metavar='FILE', help="replay recorded traffic, client part only")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(async_main(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
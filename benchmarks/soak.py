@@ -0,0 +1,391 @@
+"""Soak and fault-injection run of the Jollymec integration against the fake cloud.
+
+Run from the repository root:
+
+    python -m benchmarks.soak --hours 24 --heaters 2
+
+The climate entities and their client are set up in a Home Assistant core
+and polled on a simulated clock: each coordinator is refreshed when its own
+update interval says so, and retry backoffs and circuit breaker timeouts
+elapse in simulated time, so a day of polls takes seconds. The fake cloud
+regularly serves the communication error page, expires the sessions, and
+answers slowly or not at all. Every night at 02:47 it goes down, as the
+real site does.
+
+The report gives RSS, object, task and thread counts sampled over the run
+and, per fault, the time from the end of the fault to the first successful
+request of every heater, and the lag: how much of it was spent after the
+first poll that followed the end of the fault (breaker waits, retries),
+rather than waiting for that poll. The exit status is 1 when tracked
+objects grew or a lag exceeded the scan interval: waiting for the next poll
+can take a scan interval on its own, whatever the client does.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import timedelta
+import gc
+import heapq
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from custom_components.jollymec import hajolly
+from custom_components.jollymec.retry import CircuitBreaker, RetryPolicy
+
+from .fake_cloud import FakeCloud
+from .run import PASSWORD, USERNAME, heater_ids
+
+SCAN_INTERVAL = 60
+# Simulated seconds summed from backoffs carry float noise
+CLOCK_TOLERANCE = 1e-3
+# Timeouts of the soaked client, a hung reply costs that much real time
+# but no simulated time
+CONNECT_TIMEOUT = 1
+READ_TIMEOUT = 1
+# Real seconds added to replies by the slow and hung faults
+SLOW_LATENCY = 0.3
+HANG = 2 * READ_TIMEOUT
+NIGHTLY_OUTAGE = (timedelta(hours=2, minutes=47), timedelta(minutes=17))
+# Types whose instance count must stay flat over the run
+TRACKED_TYPES = (
+    'jollymec',
+    'Device',
+    'DeviceState',
+    'JollyMecCoordinator',
+    'ClientResponse',
+)
+# Reported too, but the count follows whatever timers happen to be pending
+NOISY_TYPES = ('TimerHandle',)
+
+
+class SimClock(object):
+    """Simulated time, moved forward by the run and by retry backoffs only.
+
+    Real waits such as slow replies and transport timeouts do not move it,
+    so results do not depend on the speed of the machine. The client, its
+    deadlines, retry policy and breaker all read ``monotonic``. Callbacks
+    given to ``call_at`` run as their time is reached, in the middle of a
+    backoff too, so faults start and end on time.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.elapsed = 0.0
+        self._origin = time.monotonic()
+        self._timers = []
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self._origin + self.elapsed
+
+    def call_at(self, elapsed, callback):
+        heapq.heappush(self._timers, (elapsed, len(self._timers), callback))
+
+    @property
+    def next_timer(self):
+        return self._timers[0][0] if self._timers else float('inf')
+
+    def advance_to(self, elapsed):
+        while self._timers and self._timers[0][0] <= elapsed:
+            when, _, callback = heapq.heappop(self._timers)
+            self.elapsed = max(self.elapsed, when)
+            callback()
+        self.elapsed = max(self.elapsed, elapsed)
+
+    async def sleep(self, delay):
+        self.advance_to(self.elapsed + delay)
+        await asyncio.sleep(0)
+
+
+def fault_kinds(latency):
+    """name -> (inject, clear, simulated duration in seconds)."""
+
+    def setter(name, value):
+        return lambda cloud: setattr(cloud, name, value)
+
+    return {
+        'error_page': (setter('outage', True), setter('outage', False), SCAN_INTERVAL),
+        'session_expiry': (FakeCloud.expire_sessions, None, 0),
+        'slow': (setter('latency', latency + SLOW_LATENCY), setter('latency', latency), 5 * SCAN_INTERVAL),
+        'hung': (setter('hang', HANG), setter('hang', 0.0), SCAN_INTERVAL),
+        'nightly_outage': (setter('outage', True), setter('outage', False), NIGHTLY_OUTAGE[1].total_seconds()),
+    }
+
+
+def fault_schedule(hours, every_minutes):
+    """(start, kind) in simulated seconds: the nightly outage plus faults in rotation."""
+    total = hours * 3600
+    rotation = ('error_page', 'session_expiry', 'slow', 'hung')
+    nightly = [
+        day * 86400 + NIGHTLY_OUTAGE[0].total_seconds()
+        for day in range(int(total // 86400) + 1)
+    ]
+    events = [(start, 'nightly_outage') for start in nightly if start < total]
+    index = 0
+    for start in range(every_minutes * 60, int(total), every_minutes * 60):
+        # Keep the rotation clear of the nightly outage and its recovery
+        if any(-1800 < start - night < 3600 for night in nightly):
+            continue
+        events.append((start, rotation[index % len(rotation)]))
+        index += 1
+    return sorted(events)
+
+
+async def timed_refresh(clock, coordinator):
+    """Refresh ``coordinator``, returning the simulated time it finished at."""
+    await coordinator.async_refresh()
+    return clock.elapsed
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        # Peak rather than current outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def take_sample(clock):
+    gc.collect()
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    sample = {
+        'hours': round(clock.elapsed / 3600, 2),
+        'rss_kb': rss_kb(),
+        'objects': sum(counts.values()),
+        'threads': threading.active_count(),
+        # The fake cloud's own connection handlers are not ours to count
+        'tasks': sum(1 for task in asyncio.all_tasks()
+                     if not task.get_coro().__qualname__.startswith('RequestHandler.')),
+    }
+    sample.update((name, counts[name]) for name in TRACKED_TYPES + NOISY_TYPES)
+    return sample
+
+
+async def soak(cloud, args):
+    from homeassistant import bootstrap, config_entries, loader
+    from homeassistant.core import HomeAssistant
+    from homeassistant.setup import async_setup_component
+    from homeassistant.util import dt as dt_util
+
+    from custom_components.jollymec.const import DATA_CLIENTS, DATA_COORDINATORS, DOMAIN
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+        hass.config_entries = config_entries.ConfigEntries(hass, {})
+        await bootstrap.async_load_base_functionality(hass)
+        await hass.async_start()
+
+        # The YAML platform always talks to the production URL
+        production_url = hajolly.baseurl
+        hajolly.baseurl = cloud.url
+        try:
+            platforms = [
+                {
+                    'platform': DOMAIN,
+                    'name': 'soak {}'.format(index),
+                    'username': USERNAME,
+                    'password': PASSWORD,
+                    'id': heater_id,
+                    'scan_interval': SCAN_INTERVAL,
+                    'connect_timeout': CONNECT_TIMEOUT,
+                    'read_timeout': READ_TIMEOUT,
+                }
+                for index, heater_id in enumerate(heater_ids(args.heaters))
+            ]
+            assert await async_setup_component(hass, 'climate', {'climate': platforms})
+            await hass.async_block_till_done()
+            coordinators = list(hass.data[DOMAIN][DATA_COORDINATORS].values())
+            while any(c.data is None for c in coordinators):
+                await asyncio.sleep(0.01)
+
+            clock = SimClock(dt_util.start_of_local_day())
+            for client in hass.data[DOMAIN][DATA_CLIENTS].values():
+                # Simulated polls are real milliseconds apart, none may be
+                # served from the freshness window
+                client.state_max_age = 0
+                client.clock = clock.monotonic
+                client.retry_policy = RetryPolicy(sleep=clock.sleep, clock=clock.monotonic)
+                client.breaker = CircuitBreaker(clock=clock.monotonic)
+            for coordinator in coordinators:
+                coordinator.clock = clock.now
+            return await run_schedule(hass, cloud, clock, coordinators, args)
+        finally:
+            hajolly.baseurl = production_url
+            await hass.async_stop(force=True)
+
+
+async def run_schedule(hass, cloud, clock, coordinators, args):
+    total = args.hours * 3600
+    kinds = fault_kinds(args.latency)
+    faults = []
+    samples = []
+    next_sample = 3600.0
+    next_due = {coordinator: 0.0 for coordinator in coordinators}
+    last_ok = {coordinator: 0.0 for coordinator in coordinators}
+    polls = 0
+    requests = cloud.total_requests
+    clients = {coordinator.device.client for coordinator in coordinators}
+    samples.append(take_sample(clock))
+
+    def start_fault(start, kind):
+        inject, clear, duration = kinds[kind]
+        inject(cloud)
+        fault = {'kind': kind, 'start': start, 'cleared': None, 'recovered': None, 'lag': None,
+                 'failed_polls': 0, 'first_polls': {}}
+        faults.append(fault)
+        clock.call_at(start + duration, lambda: end_fault(start + duration, clear, fault))
+
+    def end_fault(end, clear, fault):
+        if clear is not None:
+            clear(cloud)
+        fault['cleared'] = end
+
+    for start, kind in fault_schedule(args.hours, args.fault_every):
+        clock.call_at(start, lambda start=start, kind=kind: start_fault(start, kind))
+
+    while True:
+        # Faults start and end on time even while polls are paused
+        now = min(min(next_due.values()), clock.next_timer)
+        if now >= total:
+            break
+        clock.advance_to(now)
+        now = clock.elapsed
+
+        due = [coordinator for coordinator, when in next_due.items() if when <= now]
+        polls += len(due)
+        finished = await asyncio.gather(*(timed_refresh(clock, coordinator) for coordinator in due))
+        failed = 0
+        for coordinator, done in zip(due, finished):
+            if coordinator.last_update_success:
+                last_ok[coordinator] = done
+            else:
+                failed += 1
+            next_due[coordinator] = done + coordinator.update_interval.total_seconds()
+        for fault in faults:
+            if fault['recovered'] is None:
+                fault['failed_polls'] += failed
+            if fault['cleared'] is not None and fault['recovered'] is None:
+                # A poll overlapping the end of the fault counts from that end
+                first_polls = fault['first_polls']
+                for coordinator, done in zip(due, finished):
+                    if done >= fault['cleared']:
+                        first_polls.setdefault(coordinator.device.heater_id, max(now, fault['cleared']))
+                if all(when >= fault['cleared'] for when in last_ok.values()):
+                    fault['recovered'] = max(last_ok.values())
+                    fault['lag'] = max(
+                        last_ok[coordinator] - first_polls[coordinator.device.heater_id]
+                        for coordinator in coordinators)
+
+        # Sample once the refresh side effects have settled
+        await hass.async_block_till_done()
+        if clock.elapsed >= next_sample:
+            samples.append(take_sample(clock))
+            next_sample += args.sample_every * 60
+
+    await hass.async_block_till_done()
+    samples.append(take_sample(clock))
+    totals = {
+        'polls': polls,
+        'requests': cloud.total_requests - requests,
+        'retries': sum(client.metrics.counters['retries'] for client in clients),
+        'deadlines': sum(client.metrics.errors['deadline'] for client in clients),
+    }
+    return samples, faults, totals
+
+
+def summarize(samples, faults, totals):
+    # The first hour warms caches and pools up; a leak raises the floor of
+    # the later samples while pending timers and requests only add noise
+    base = samples[1] if len(samples) > 2 else samples[0]
+    later = samples[max(2, len(samples) // 2):] or samples[-1:]
+    growth = {name: min(sample[name] for sample in later) - base[name]
+              for name in TRACKED_TYPES + NOISY_TYPES + ('tasks', 'threads', 'objects', 'rss_kb')}
+    recovery = {}
+    for fault in faults:
+        if fault['cleared'] is None:
+            # Still running when the run ended, e.g. the nightly outage of a short run
+            continue
+        entry = recovery.setdefault(
+            fault['kind'],
+            {'count': 0, 'failed_polls': 0, 'unrecovered': 0, 'max_s': 0.0, 'total_s': 0.0, 'max_lag_s': 0.0})
+        entry['count'] += 1
+        entry['failed_polls'] += fault['failed_polls']
+        if fault['recovered'] is None:
+            entry['unrecovered'] += 1
+            continue
+        seconds = fault['recovered'] - fault['cleared']
+        entry['max_s'] = max(entry['max_s'], seconds)
+        entry['total_s'] += seconds
+        entry['max_lag_s'] = max(entry['max_lag_s'], fault['lag'])
+    for entry in recovery.values():
+        recovered = entry['count'] - entry['unrecovered']
+        entry['mean_s'] = entry.pop('total_s') / recovered if recovered else None
+    flat = all(growth[name] <= 0 for name in TRACKED_TYPES + ('tasks', 'threads'))
+    prompt = all(
+        entry['max_lag_s'] <= SCAN_INTERVAL + CLOCK_TOLERANCE and not entry['unrecovered']
+        for entry in recovery.values())
+    summary = {'growth': growth, 'recovery': recovery, 'flat': flat, 'prompt_recovery': prompt}
+    summary.update(totals)
+    return summary
+
+
+def print_report(samples, summary, out=sys.stdout):
+    columns = ('hours', 'rss_kb', 'objects', 'threads', 'tasks') + TRACKED_TYPES + NOISY_TYPES
+    out.write(''.join('{:>14}'.format(column[:13]) for column in columns) + "\n")
+    for sample in samples:
+        out.write(''.join('{:>14}'.format(sample[column]) for column in columns) + "\n")
+    out.write("\ngrowth over the first hour (lowest of the second half): {}\n\n".format(
+        ', '.join('{} {:+}'.format(name, value) for name, value in summary['growth'].items())))
+    out.write("{:<18}{:>8}{:>14}{:>14}{:>14}{:>14}{:>14}\n".format(
+        'fault', 'count', 'failed_polls', 'unrecovered', 'mean_s', 'max_s', 'max_lag_s'))
+    for kind, entry in sorted(summary['recovery'].items()):
+        mean = '-' if entry['mean_s'] is None else '{:.0f}'.format(entry['mean_s'])
+        out.write("{:<18}{:>8}{:>14}{:>14}{:>14}{:>14.0f}{:>14.0f}\n".format(
+            kind, entry['count'], entry['failed_polls'], entry['unrecovered'], mean, entry['max_s'],
+            entry['max_lag_s']))
+    out.write("\n{} cloud requests, {} polls, {} retries, {} deadlines exceeded\n".format(
+        summary['requests'], summary['polls'], summary['retries'], summary['deadlines']))
+    out.write("\ntracked objects flat: {}\nrecovered within {}s of the next poll: {}\n".format(
+        'yes' if summary['flat'] else 'NO', SCAN_INTERVAL, 'yes' if summary['prompt_recovery'] else 'NO'))
+
+
+async def async_main(args):
+    async with FakeCloud(heater_ids(args.heaters), latency=args.latency) as cloud:
+        return await soak(cloud, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=int, default=24, help="simulated hours (default 24)")
+    parser.add_argument('--heaters', type=int, default=2, help="number of heaters (default 2)")
+    parser.add_argument('--latency', type=float, default=0.0, help="added cloud latency in seconds (default 0)")
+    parser.add_argument('--fault-every', type=int, default=60, help="simulated minutes between faults (default 60)")
+    parser.add_argument('--sample-every', type=int, default=240,
+                        help="simulated minutes between memory samples (default 240)")
+    parser.add_argument('--json', metavar='FILE', help="also write the samples and faults as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the integration's warnings")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.CRITICAL)
+    samples, faults, totals = asyncio.run(async_main(args))
+    summary = summarize(samples, faults, totals)
+    print_report(samples, summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'samples': samples, 'faults': faults, 'summary': summary}, f, indent=2)
+    return 0 if summary['flat'] and summary['prompt_recovery'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
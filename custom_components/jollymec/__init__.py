@@ -0,0 +1,77 @@
+"""The Jollymec integration."""
+import asyncio
+from functools import partial
+import logging
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_ID, EVENT_HOMEASSISTANT_CLOSE, Platform
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DATA_CLIENTS,
+    DATA_CONSUMPTION_STORE,
+    DATA_COORDINATORS,
+    DATA_SESSION_STORE,
+    DATA_SNAPSHOT_STORE,
+    DATA_TELEMETRY_STORE,
+    DOMAIN,
+)
+from .climate import entry_config
+from .coordinator import async_close_clients, async_create_coordinator, async_remove_coordinator
+from .storage import (
+    CONSUMPTION_SAVE_DELAY,
+    SNAPSHOT_SAVE_DELAY,
+    STORAGE_KEY_CONSUMPTION,
+    STORAGE_KEY_SNAPSHOTS,
+    STORAGE_KEY_TELEMETRY,
+    TELEMETRY_SAVE_DELAY,
+    JollyMecHeaterStore,
+    JollyMecSessionStore,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+PLATFORMS = [Platform.CLIMATE, Platform.SENSOR]
+
+
+async def async_setup(hass: HomeAssistant, config) -> bool:
+    """Set up the Jollymec component."""
+    store = JollyMecSessionStore(hass)
+    telemetry_store = JollyMecHeaterStore(hass, STORAGE_KEY_TELEMETRY, TELEMETRY_SAVE_DELAY)
+    consumption_store = JollyMecHeaterStore(hass, STORAGE_KEY_CONSUMPTION, CONSUMPTION_SAVE_DELAY)
+    snapshot_store = JollyMecHeaterStore(hass, STORAGE_KEY_SNAPSHOTS, SNAPSHOT_SAVE_DELAY)
+    await asyncio.gather(
+        store.async_load(),
+        telemetry_store.async_load(),
+        consumption_store.async_load(),
+        snapshot_store.async_load(),
+    )
+    hass.data[DOMAIN] = {
+        DATA_CLIENTS: {},
+        DATA_COORDINATORS: {},
+        DATA_SESSION_STORE: store,
+        DATA_TELEMETRY_STORE: telemetry_store,
+        DATA_CONSUMPTION_STORE: consumption_store,
+        DATA_SNAPSHOT_STORE: snapshot_store,
+    }
+    # Account clients are not cleaned up by Home Assistant, see _async_get_client
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, partial(async_close_clients, hass))
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up a heater from a config entry without waiting on the cloud."""
+    coordinator = await async_create_coordinator(hass, entry_config(entry))
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{coordinator.name} first refresh"
+    )
+    return True
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry."""
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        await async_remove_coordinator(hass, entry.data[CONF_ID])
+    return unload_ok
@@ -8,33 +8,66 @@ from typing import Any
 from .hajolly import ( 
     ConnectionError,
     Error as JollyMecError,
+    Status,
     UnauthorizedError,
-    jollymec,
 )
 
-logging.basicConfig(filename='/tmp/jollymec_test.log', format='%(asctime)s %(message)s', level=logging.INFO)
 _LOGGER = logging.getLogger(__name__)
-_LOGGER.setLevel(logging.DEBUG)
-_LOGGER.debug("Debug mode is explicitly enabled.")
 
-requests_logger = logging.getLogger("requests.packages.urllib3")
-requests_logger.setLevel(logging.DEBUG)
-requests_logger.propagate = True
-
-#from . import DOMAIN
+from .const import (
+    CONF_CONNECT_TIMEOUT,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_IDLE_SCAN_INTERVAL,
+    CONF_MAINTENANCE_DURATION,
+    CONF_MAINTENANCE_START,
+    CONF_MAX_CONCURRENCY,
+    CONF_OPERATION_TIMEOUT,
+    CONF_PELLET_RATES,
+    CONF_PERSIST_TELEMETRY,
+    CONF_READ_TIMEOUT,
+    CONF_SMOKE_DEADBAND,
+    CONF_TELEMETRY_SAMPLES,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_TRAFFIC_FILE,
+    CONF_TRAFFIC_MODE,
+    DATA_COORDINATORS,
+    DEFAULT_NAME,
+    DOMAIN,
+    FAST_SCAN_INTERVAL,
+    IDLE_SCAN_INTERVAL,
+    MAINTENANCE_DURATION,
+    MAINTENANCE_START,
+    SCAN_INTERVAL,
+    SMOKE_DEADBAND,
+    TEMPERATURE_DEADBAND,
+    TRAFFIC_FILE,
+    TRAFFIC_LIVE,
+    TRAFFIC_RECORD,
+    TRAFFIC_REPLAY,
+)
+from .consumption import PELLET_RATES
+from .control import COLD_TOLERANCE, HOT_TOLERANCE, HysteresisController
+from .hajolly import MAX_CONCURRENCY, OPERATION_TIMEOUT
+from .coordinator import async_create_coordinator
+from .entity import JollyMecEntity
+from .telemetry import TELEMETRY_SAMPLES
+from .transport import CONNECT_TIMEOUT, READ_TIMEOUT
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.util import Throttle
-from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.restore_state import RestoredExtraData, RestoreEntity
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.event import (
+    async_call_later,
     async_track_state_change_event,
     async_track_time_interval,
 )
 from homeassistant.core import DOMAIN as HA_DOMAIN, CoreState, callback
-from homeassistant.const import (ATTR_ENTITY_ID, ATTR_TEMPERATURE, CONF_NAME, CONF_USERNAME, CONF_PASSWORD, CONF_UNIQUE_ID ,CONF_ID, EVENT_HOMEASSISTANT_START,)
+from homeassistant.const import (ATTR_ENTITY_ID, ATTR_TEMPERATURE, CONF_NAME, CONF_PLATFORM, CONF_USERNAME, CONF_PASSWORD, CONF_UNIQUE_ID ,CONF_ID, CONF_SCAN_INTERVAL, EVENT_HOMEASSISTANT_START, STATE_UNAVAILABLE, STATE_UNKNOWN, Platform,)
 from homeassistant.const import TEMP_CELSIUS, DEVICE_CLASS_TEMPERATURE
 from homeassistant.components.climate import ClimateEntity, PLATFORM_SCHEMA 
 from homeassistant.components.climate.const import (
+    ATTR_CURRENT_TEMPERATURE,
     ATTR_PRESET_MODE,
     PRESET_AWAY,
     PRESET_NONE,
@@ -61,11 +94,11 @@ from homeassistant.components.climate.const import (
 ATTR_DEVICE_ALARM = "alarm_code"
 ATTR_DEVICE_STATUS = "device_status"
 ATTR_HUMAN_DEVICE_STATUS = "human_device_status"
+ATTR_PENDING = "pending"
 ATTR_REAL_POWER = "real_power"
 ATTR_SMOKE_TEMP = "smoke_temperature"
-
-scan_interval = timedelta(minutes=1)
-DEFAULT_NAME = "Jollymec"
+ATTR_STALE = "stale"
+ATTR_STOVE_TEMP = "stove_temperature"
 
 CONF_PRESETS = {
     p: f"{p}_temp"
@@ -117,64 +150,109 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_AC_MODE): cv.boolean,
     vol.Optional(CONF_MAX_TEMP): vol.Coerce(float),
     vol.Optional(CONF_MIN_DUR): cv.positive_time_period,
+    vol.Optional(CONF_COLD_TOLERANCE, default=COLD_TOLERANCE): vol.Coerce(float),
+    vol.Optional(CONF_HOT_TOLERANCE, default=HOT_TOLERANCE): vol.Coerce(float),
     vol.Optional(CONF_MIN_TEMP): vol.Coerce(float),
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
     vol.Optional(CONF_TARGET_TEMP): vol.Coerce(float),
     vol.Optional(CONF_KEEP_ALIVE): cv.positive_time_period,
-    #vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): cv.time_period
+    vol.Optional(CONF_INITIAL_HVAC_MODE): vol.In([HVACMode.HEAT, HVACMode.OFF]),
+    vol.Optional(CONF_SCAN_INTERVAL, default=SCAN_INTERVAL): cv.positive_time_period,
+    vol.Optional(CONF_FAST_SCAN_INTERVAL, default=FAST_SCAN_INTERVAL): cv.positive_time_period,
+    vol.Optional(CONF_IDLE_SCAN_INTERVAL, default=IDLE_SCAN_INTERVAL): cv.positive_time_period,
+    vol.Optional(CONF_MAINTENANCE_START, default=MAINTENANCE_START): cv.time,
+    vol.Optional(CONF_MAINTENANCE_DURATION, default=MAINTENANCE_DURATION): cv.time_period,
+    vol.Optional(CONF_TRAFFIC_MODE, default=TRAFFIC_LIVE): vol.In([TRAFFIC_LIVE, TRAFFIC_RECORD, TRAFFIC_REPLAY]),
+    vol.Optional(CONF_TRAFFIC_FILE, default=TRAFFIC_FILE): cv.string,
+    vol.Optional(CONF_TELEMETRY_SAMPLES, default=TELEMETRY_SAMPLES): vol.All(vol.Coerce(int), vol.Range(min=2)),
+    vol.Optional(CONF_PERSIST_TELEMETRY, default=True): cv.boolean,
+    vol.Optional(CONF_PELLET_RATES, default=PELLET_RATES): {vol.Coerce(int): vol.Coerce(float)},
+    vol.Optional(CONF_MAX_CONCURRENCY, default=MAX_CONCURRENCY): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_TEMPERATURE_DEADBAND, default=TEMPERATURE_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_SMOKE_DEADBAND, default=SMOKE_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_CONNECT_TIMEOUT, default=CONNECT_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(CONF_READ_TIMEOUT, default=READ_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(CONF_OPERATION_TIMEOUT, default=OPERATION_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=1)),
 }).extend({vol.Optional(v): vol.Coerce(float) for (k, v) in CONF_PRESETS.items()}).extend({vol.Optional(v): vol.Coerce(int) for (k, v) in CONF_FAN.items()})
 
 
 
 async def async_setup_platform(hass, config, async_add_entities,  discovery_info = None):
+    """Set up a Jollymec heater from YAML; its first poll runs in the background."""
+    coordinator = await async_create_coordinator(hass, config)
+    async_add_entities([_create_entity(config, coordinator, config.get(CONF_UNIQUE_ID))])
+    hass.async_create_background_task(
+        coordinator.async_refresh(), f"{coordinator.name} first refresh"
+    )
 
-    initial_hvac_mode = config.get(CONF_INITIAL_HVAC_MODE)
-
-    """Set up Jollymec climate, nothing to do."""
-    username = config.get(CONF_USERNAME)
-    password = config.get(CONF_PASSWORD)
     heater_id = config.get(CONF_ID)
-    unique_id = config.get(CONF_UNIQUE_ID)
     name = config.get(CONF_NAME)
-    min_temp = config.get(CONF_MIN_TEMP)
-    max_temp = config.get(CONF_MAX_TEMP)
-    target_temp = config.get(CONF_TARGET_TEMP)
-    ac_mode = config.get(CONF_AC_MODE)
-    min_cycle_duration = config.get(CONF_MIN_DUR)
+    hass.async_create_task(
+        async_load_platform(
+            hass, Platform.SENSOR, DOMAIN, {CONF_ID: heater_id, CONF_NAME: name}, config
+        )
+    )
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the heater of a config entry, created and refreshed by the integration."""
+    coordinator = hass.data[DOMAIN][DATA_COORDINATORS][entry.data[CONF_ID]]
+    async_add_entities([_create_entity(entry_config(entry), coordinator, entry.unique_id)])
+
+
+def entry_config(entry):
+    """Platform config of a config entry, with the defaults of the YAML options."""
+    return PLATFORM_SCHEMA({CONF_PLATFORM: DOMAIN, **entry.data, **entry.options})
+
+
+def _create_entity(config, coordinator, unique_id):
     presets = {
         key: config[value] for key, value in CONF_PRESETS.items() if value in config
     }
     fans = {
         key: config[value] for key, value in CONF_FAN.items() if value in config
     }
-    
-    jolly = await  hass.async_add_executor_job(jollymec, username, password, heater_id)
-    device = jolly.devices[0]
-
-    async_add_entities([JollyMecDevice(
-        name,
+    return JollyMecDevice(
+        config.get(CONF_NAME),
         unique_id,
-        heater_id, 
-        device, 
-        min_temp,
-        max_temp,
-        target_temp,
-        ac_mode,
-        min_cycle_duration,
-        initial_hvac_mode,
+        config.get(CONF_ID),
+        coordinator,
+        config.get(CONF_MIN_TEMP),
+        config.get(CONF_MAX_TEMP),
+        config.get(CONF_TARGET_TEMP),
+        config.get(CONF_INITIAL_HVAC_MODE),
+        config.get(CONF_AC_MODE),
+        config.get(CONF_MIN_DUR),
         presets,
         fans,
-        )], True)
-
-class JollyMecDevice(ClimateEntity, RestoreEntity) :
-    """Representation of an Jollymec heating device."""
+        config.get(CONF_SENSOR),
+        config.get(CONF_COLD_TOLERANCE, COLD_TOLERANCE),
+        config.get(CONF_HOT_TOLERANCE, HOT_TOLERANCE),
+        config.get(CONF_KEEP_ALIVE),
+        )
+
+
+class JollyMecDevice(JollyMecEntity, ClimateEntity, RestoreEntity) :
+    """Representation of an Jollymec heating device.
+
+    With a ``target_sensor`` the thermostat runs locally: the target
+    temperature stays in Home Assistant, the room temperature comes from the
+    sensor and the stove is only turned on or off when the hysteresis of
+    the HysteresisController calls for it.
+    """
+
+    _deadbands = {
+        ATTR_CURRENT_TEMPERATURE: 'air_temperature',
+        ATTR_SMOKE_TEMP: 'smoke_temperature',
+        ATTR_STOVE_TEMP: 'air_temperature',
+    }
 
     def __init__(
         self, 
         name, 
         unique_id,
         heater_id,
-        device,
+        coordinator,
         min_temp,
         max_temp,
         target_temp,
@@ -183,15 +261,20 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
         min_cycle_duration,
         presets,
         fans,
+        target_sensor=None,
+        cold_tolerance=COLD_TOLERANCE,
+        hot_tolerance=HOT_TOLERANCE,
+        keep_alive=None,
         ):
         
         
         """Initialize the thermostat."""
+        super().__init__(coordinator)
         self._name = name
         self._attr_name = name
         self._unique_id = unique_id 
         self._attr_unique_id = unique_id 
-        self._device = device
+        self._device = coordinator.device
         self._preset_mode = PRESET_NONE
         self._attr_native_unit_of_measurement = TEMP_CELSIUS
         # self._attr_fan_modes = None 
@@ -223,61 +306,81 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
             self._attr_fan_modes = [FAN_OFF]
         self._fans = fans
         self._attributes = {}
+        self._saved_target_temp = None
+        self._sensor_entity_id = target_sensor
+        self._keep_alive = keep_alive
+        self._controller = None
+        self._control_retry = None
+        # A decision waited on an unconfirmed command, see _handle_coordinator_update
+        self._control_deferred = False
+        if target_sensor is not None:
+            self._controller = HysteresisController(
+                cold_tolerance,
+                hot_tolerance,
+                min_cycle_duration.total_seconds() if min_cycle_duration else 0.0,
+            )
         
         # _LOGGER.debug("liste des modes de puissance : %s", fans)
     async def async_added_to_hass(self):
         """Run when entity about to be added."""
         await super().async_added_to_hass()
 
+        if self._controller is not None:
+            self.async_on_remove(
+                async_track_state_change_event(
+                    self.hass, [self._sensor_entity_id], self._async_sensor_changed
+                )
+            )
+            if self._keep_alive:
+                self.async_on_remove(
+                    async_track_time_interval(self.hass, self._async_control_heating, self._keep_alive)
+                )
+            self.async_on_remove(self._cancel_control_retry)
+
         @callback
         def _async_startup(*_):
             """Init on startup."""
+            if self._controller is not None:
+                sensor_state = self.hass.states.get(self._sensor_entity_id)
+                if sensor_state is not None:
+                    self._async_update_temp(sensor_state)
 
         if self.hass.state == CoreState.running:
             _async_startup()
         else:
             self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START, _async_startup)
 
-        # #Check If we have an old state
-        # old_state = await self.async_get_last_state()
-        # if old_state is not None:
-        #     # If we have no initial temperature, restore
-        #     if self._target_temp is None:
-        #         # If we have a previously saved temperature
-        #         if old_state.attributes.get(ATTR_TEMPERATURE) is None:
-        #             if self.ac_mode:
-        #                 self._target_temp = self.max_temp
-        #             else:
-        #                 self._target_temp = self.min_temp
-        #             _LOGGER.warning(
-        #                 "Undefined target temperature, falling back to %s",
-        #                 self._target_temp,
-        #             )
-        #         else:
-        #             self._target_temp = float(old_state.attributes[ATTR_TEMPERATURE])
-        #     if old_state.attributes.get(ATTR_PRESET_MODE) is not None:
-        #         self._preset_mode = old_state.attributes.get(ATTR_PRESET_MODE)
-        #     if not self._hvac_mode and old_state.state:
-        #         self._hvac_mode = old_state.state
-        #     for x in self.preset_modes:
-        #         if old_state.attributes.get(x + "_temp") is not None:
-        #              self._attributes[x + "_temp"] = old_state.attributes.get(x + "_temp")
-        # else:
-        # #No previous state, try and restore defaults
-        #     if self._target_temp is None:
-        #         if self.ac_mode:
-        #             self._target_temp = self.max_temp
-        #         else:
-        #             self._target_temp = self.min_temp
-        #     _LOGGER.warning(
-        #         "No previously saved temperature, setting to %s", self._target_temp
-        #     )
-
+        # Presets and local setpoints are not known to the cloud, take them
+        # back from the last run; the stove itself comes from the snapshot
+        last_extra = await self.async_get_last_extra_data()
+        if last_extra is not None:
+            self._restore(last_extra.as_dict())
 
         # Set default state to off
         if not self._hvac_mode:
             self._hvac_mode = HVACMode.OFF
 
+    @property
+    def extra_restore_state_data(self):
+        return RestoredExtraData({
+            'preset_mode': self._preset_mode,
+            'preset_temperatures': dict(self._attributes),
+            'target_temperature': self._target_temp,
+            'saved_target_temperature': self._saved_target_temp,
+            'hvac_mode': self._hvac_mode,
+        })
+
+    def _restore(self, data):
+        if data.get('preset_mode') in self.preset_modes:
+            self._preset_mode = data['preset_mode']
+        self._attributes.update(data.get('preset_temperatures') or {})
+        self._saved_target_temp = data.get('saved_target_temperature')
+        # Configured values win over restored ones
+        if self._target_temp is None:
+            self._target_temp = data.get('target_temperature')
+        if not self._hvac_mode and data.get('hvac_mode') in (HVACMode.HEAT, HVACMode.OFF):
+            self._hvac_mode = HVACMode(data['hvac_mode'])
+
     @property
     def supported_features(self):
         """Return the list of supported features."""
@@ -286,13 +389,19 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
     @property
     def extra_state_attributes(self):
         """Return the device specific state attributes."""
-        return {
+        attributes = {
             ATTR_DEVICE_ALARM: self._device.alarms,
             ATTR_DEVICE_STATUS: self._device.status,
             ATTR_HUMAN_DEVICE_STATUS: self._device.status_translated,
             ATTR_SMOKE_TEMP: self._device.gas_temperature,
             ATTR_REAL_POWER: self._device.real_power,
+            ATTR_PENDING: self._device.pending,
+            ATTR_STALE: self.coordinator.stale,
         }
+        if self._controller is not None:
+            # current_temperature is the room sensor, keep the stove probe visible
+            attributes[ATTR_STOVE_TEMP] = self._device.air_temperature
+        return attributes
 
 
     @property
@@ -324,13 +433,12 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
         """
         # _LOGGER.debug("affichage _hvac_mode : %s", self._hvac_mode)
         #_LOGGER.debug("affichage is_device_active : %s", self._is_device_active)
-        if self._hvac_mode == HVACMode.OFF:
+        if self.hvac_mode == HVACMode.OFF:
             return HVACAction.OFF
         if not self._is_device_active:
             return HVACAction.IDLE
         if self.ac_mode:
             return HVACAction.COOLING
-        _LOGGER.debug("affichage HVACAction : %s", HVACAction.HEATING)
         return HVACAction.HEATING
 
     @property
@@ -346,14 +454,15 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
             fan_modes.append(str(x))
         return fan_modes
         
-    def set_fan_mode(self, fan_mode):
+    async def async_set_fan_mode(self, fan_mode):
         """Set new target fan mode."""
         # _LOGGER.debug("valeur de puissance choisie: %s", fan_mode)
         # if fan_mode is None or not fan_mode.isdigit():
         #     return
 
         try:
-            self._device.set_power = int(fan_mode)
+            await self._device.async_set_power(int(fan_mode))
+            self.coordinator.async_command_sent()
         except JollyMecError as err:
             _LOGGER.error("Failed to set fan mode, error: %s", err)
 
@@ -376,6 +485,8 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
     def current_temperature(self):
         """Return the current temperature."""
         #_LOGGER.debug("valeur de temperature: %s", self._device.air_temperature)
+        if self._controller is not None:
+            return self._cur_temp
         return self._device.air_temperature
 
 
@@ -404,47 +515,64 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
     @property
     def target_temperature(self):
         """Return the temperature we try to reach."""
+        if self._controller is not None and self._target_temp is not None:
+            return self._target_temp
         return self._device.target_temperature
         #Enregistrement dans la valeur des presets
         #return self._target_temp
 
-    def update(self):
-        """Get the latest data."""
-        self._device.update()
-        #_LOGGER.debug("retour update temp : %s", self._device.air_temperature)
-        return True
     @property
     def hvac_mode(self):
         """Return hvac operation ie. heat, cool mode."""
-        if self._device.status != 0:
-            return HVACMode.HEAT
-        return HVACMode.OFF
+        if self._controller is not None:
+            # Heating with the stove idle between cycles is still heat
+            return self._hvac_mode
+        if self._device.status == Status.OFF:
+            return HVACMode.OFF
+        return HVACMode.HEAT
+
 
+    async def async_set_hvac_mode(self, hvac_mode):
+        """Set new target hvac mode.
 
-    def set_hvac_mode(self, hvac_mode):
-        """Set new target hvac mode."""
-        _LOGGER.debug("enter async")
+        The device shows the requested status as pending right away and the
+        coordinator writes the state; nothing is written here before that.
+        """
+        if self._controller is not None:
+            if hvac_mode not in (HVACMode.OFF, HVACMode.HEAT):
+                return
+            self._hvac_mode = hvac_mode
+            if hvac_mode == HVACMode.OFF and self._is_device_active:
+                await self._async_switch(False)
+            else:
+                await self._async_control_heating()
+            self.async_write_ha_state()
+            return
         if hvac_mode == HVACMode.OFF:
-            self._hvac_mode= HVACAction.OFF
-            self.turn_off()
+            await self.async_turn_off()
         elif hvac_mode == HVACMode.HEAT:
-            self._hvac_mode= HVACMode.HEAT
-            self.turn_on()
-        self.async_write_ha_state()
+            await self.async_turn_on()
 
-    def update_temperature(self, value):
+    async def async_update_temperature(self, value):
         """Update temp"""
-        self._device.set_air_temperature(value)
+        if self._controller is not None:
+            # The setpoint lives here, the loop decides what reaches the stove
+            self._target_temp = float(value)
+            await self._async_control_heating()
+            self.async_write_ha_state()
+            return
+        try:
+            await self._device.async_set_air_temperature(value)
+            self.coordinator.async_command_sent()
+        except JollyMecError as err:
+            _LOGGER.error("Failed to set temperature, error: %s", err)
             # if self.current_temperature != value and retrycounter < 5:
             #     retrycounter=retrycounter+1        
             #     logging.warn("Communications error, trying again (retry %s of 5)", retrycounter)
             #     time.sleep(5)
             #     self._device.set_air_temperature(value)
 
-        #  except JollyMecError as err:
-        #     _LOGGER.error("Failed to set temperature, error: %s", err)       
-
-    def set_temperature(self, **kwargs: Any) -> None:
+    async def async_set_temperature(self, **kwargs: Any) -> None:
         """Set new target temperature."""
         if (temperature := kwargs.get(ATTR_TEMPERATURE)) is None:
             return
@@ -452,32 +580,115 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
         self._target_temp = temperature
         if self._preset_mode != PRESET_NONE:
             self._attributes[self._preset_mode + "_temp"] = self._target_temp
-        self.update_temperature(temperature)
+        await self.async_update_temperature(temperature)
         _LOGGER.debug("set temperature %s", temperature)
         # await self._async_control_heating(force=True)
         # self.async_write_ha_state()
 
-    def turn_on(self):
+    async def async_turn_on(self):
         try:
-            self._device.turn_on()
+            await self._device.async_turn_on()
+            self.coordinator.async_command_sent()
         except JollyMecError as err:
             _LOGGER.error("Failed to turn on device, error: %s", err)
 
-    def turn_off(self):
+    async def async_turn_off(self):
         """Turn device off."""
         try:
-            self._device.turn_off()
+            await self._device.async_turn_off()
+            self.coordinator.async_command_sent()
         except JollyMecError as err:
             _LOGGER.error("Failed to turn off device, error: %s", err)
 
-    def set_preset_mode(self, preset_mode: str):
+    async def _async_sensor_changed(self, event):
+        """Follow the room sensor; the loop only acts on a changed value."""
+        new_state = event.data.get("new_state")
+        if new_state is None or not self._async_update_temp(new_state):
+            return
+        await self._async_control_heating()
+        if self._changed(self._snapshot()):
+            self.async_write_ha_state()
+
+    @callback
+    def _async_update_temp(self, state):
+        """Take the room temperature from ``state``, True if it changed."""
+        if state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return False
+        try:
+            value = float(state.state)
+        except ValueError:
+            _LOGGER.error("Unable to update from sensor %s: %s", self._sensor_entity_id, state.state)
+            return False
+        if value == self._cur_temp:
+            return False
+        self._cur_temp = value
+        return True
+
+    async def _async_control_heating(self, now=None):
+        """Turn the stove on or off if the room temperature calls for it.
+
+        Nothing is sent while the loop is off or the stove state is unknown.
+        A decision waiting on an unconfirmed on/off command is taken again
+        after the next poll, one blocked by min_cycle_duration once the
+        cycle is over.
+        """
+        async with self._temp_lock:
+            self._control_deferred = False
+            if self._hvac_mode != HVACMode.HEAT or self.coordinator.data is None:
+                return
+            if 'status' in self._device.pending or self.coordinator.stale:
+                self._control_deferred = True
+                return
+            if self._device.status in (None, Status.ALARM):
+                return
+            active = self._device.status not in (Status.OFF, Status.FINAL_CLEANING)
+            wanted = self._controller.wanted(self._cur_temp, self.target_temperature, active)
+            if wanted is None:
+                return
+            if wanted and self._device.status == Status.FINAL_CLEANING:
+                # The stove refuses to light before the cleaning is over
+                return
+            blocked = self._controller.blocked_for()
+            if blocked > 0:
+                if self._control_retry is None:
+                    self._control_retry = async_call_later(self.hass, blocked, self._async_control_retry)
+                return
+            await self._async_switch(wanted)
+
+    @callback
+    def _handle_coordinator_update(self):
+        super()._handle_coordinator_update()
+        if self._control_deferred and 'status' not in self._device.pending and not self.coordinator.stale:
+            self._control_deferred = False
+            self.hass.async_create_task(self._async_control_heating())
+
+    async def _async_control_retry(self, now):
+        self._control_retry = None
+        await self._async_control_heating()
+
+    @callback
+    def _cancel_control_retry(self):
+        if self._control_retry is not None:
+            self._control_retry()
+            self._control_retry = None
+
+    async def _async_switch(self, on):
+        _LOGGER.debug("Turning %s %s from %s", self._heater_id, "on" if on else "off", self._sensor_entity_id)
+        self._controller.switched()
+        if on:
+            await self.async_turn_on()
+        else:
+            await self.async_turn_off()
+
+    async def async_set_preset_mode(self, preset_mode: str):
         """Set new preset mode."""
         """Test if Preset mode is valid"""
-        _LOGGER.debug("mode selectionné : %s", preset_mode)
-        _LOGGER.debug("puissance associée : %s", self._fans[preset_mode])
-        _LOGGER.debug("temperature associée : %s", self._presets[preset_mode])
         if not preset_mode in self.preset_modes:
             return
+        # PRESET_NONE and presets without a configured power have no entry
+        _LOGGER.debug("mode selectionné : %s", preset_mode)
+        _LOGGER.debug("puissance associée : %s", self._fans.get(preset_mode))
+        _LOGGER.debug("temperature associée : %s", self._presets.get(preset_mode))
         """if old value is preset_none we store the temp"""
         if self._preset_mode == PRESET_NONE:
             self._saved_target_temp = self._target_temp
@@ -487,8 +698,28 @@ class JollyMecDevice(ClimateEntity, RestoreEntity) :
             self._target_temp = self._saved_target_temp
         else:
             temp = self._attributes.get(self._preset_mode + "_temp", self._target_temp)
-            self._target_temp = float(temp)
-        self.update_temperature(self._presets[preset_mode])
-        self.set_fan_mode(self._fans[preset_mode])
+            if temp is not None:
+                self._target_temp = float(temp)
+        if self._controller is not None:
+            if preset_mode != PRESET_NONE:
+                # Presets without a temperature keep the current target
+                temp = self._attributes.get(preset_mode + "_temp", self._presets.get(preset_mode))
+                if temp is not None:
+                    self._target_temp = float(temp)
+            # Only the power of the preset has to reach the stove, and only
+            # when it differs from what the stove runs at
+            power = self._fans.get(preset_mode)
+            if power is not None and self._device.current_power != int(power):
+                await self.async_set_fan_mode(power)
+            await self._async_control_heating()
+            self.async_write_ha_state()
+            return
+        # Queued together, both writes leave in the same debounced flush
+        writes = []
+        if preset_mode in self._presets:
+            writes.append(self.async_update_temperature(self._presets[preset_mode]))
+        if preset_mode in self._fans:
+            writes.append(self.async_set_fan_mode(self._fans[preset_mode]))
+        await asyncio.gather(*writes)
         #await self._async_control_heating(force=True)
         self.async_write_ha_state()       
@@ -1,18 +1,107 @@
+"""Config flow for Jollymec heating devices."""
+import asyncio
+import logging
+
+import aiohttp
+import voluptuous as vol
+
 from homeassistant import config_entries
-from .const import DOMAIN
+from homeassistant.const import CONF_ID, CONF_NAME, CONF_PASSWORD, CONF_USERNAME
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+
+from .const import DATA_CLIENTS, DEFAULT_NAME, DOMAIN
+from .hajolly import Error as JollyMecError, JollyMecClient, UnauthorizedError
+from .retry import RetryPolicy
+
+_LOGGER = logging.getLogger(__name__)
+
+STEP_USER_DATA_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_USERNAME): str,
+        vol.Required(CONF_PASSWORD): str,
+        vol.Required(CONF_ID): str,
+        vol.Optional(CONF_NAME, default=DEFAULT_NAME): str,
+    }
+)
+
+# Someone is waiting on the form, don't back off for minutes
+VALIDATION_RETRY_POLICY = RetryPolicy(retries=1, base_delay=1.0)
+
+
+async def async_validate_input(hass, data):
+    """Log in and read the state of the heater once.
+
+    A heater of an account already set up is checked with the client of
+    that account, so its session is not replaced. Otherwise a throwaway
+    session is used and a failed attempt leaves no cookies behind.
+    """
+    clients = hass.data.get(DOMAIN, {}).get(DATA_CLIENTS, {})
+    client = clients.get(data[CONF_USERNAME].lower())
+    session = None
+    if client is None or client.password != data[CONF_PASSWORD]:
+        session = async_create_clientsession(hass, auto_cleanup=False)
+        client = JollyMecClient(
+            session, data[CONF_USERNAME], data[CONF_PASSWORD], retry_policy=VALIDATION_RETRY_POLICY
+        )
+    try:
+        await client.async_ensure_session()
+        result = await client.async_get_state(data[CONF_ID])
+    except UnauthorizedError as err:
+        raise InvalidAuth from err
+    except (JollyMecError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+        raise CannotConnect from err
+    finally:
+        if session is not None:
+            await session.close()
+
+    if result['state'] == "NOT LOGGED IN":
+        raise InvalidAuth
+    if result['state'].startswith("GET STATE STATUS NOT OK"):
+        raise UnknownHeater
+    if result['state'] != "OK":
+        raise CannotConnect
+
+
+class JollyMecConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Handle a config flow for Jollymec."""
+
+    VERSION = 1
+
+    async def async_step_user(self, user_input=None):
+        """Ask for the efesto account and the heater id."""
+        errors = {}
+        if user_input is not None:
+            await self.async_set_unique_id(user_input[CONF_ID])
+            self._abort_if_unique_id_configured()
+            try:
+                await async_validate_input(self.hass, user_input)
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+            except InvalidAuth:
+                errors["base"] = "invalid_auth"
+            except UnknownHeater:
+                errors[CONF_ID] = "unknown_heater"
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
+            else:
+                return self.async_create_entry(title=user_input[CONF_NAME], data=user_input)
+
+        return self.async_show_form(
+            step_id="user",
+            data_schema=self.add_suggested_values_to_schema(STEP_USER_DATA_SCHEMA, user_input),
+            errors=errors,
+        )
+
 
+class CannotConnect(HomeAssistantError):
+    """Error to indicate we cannot connect."""
 
-class ExampleConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
-    """Example config flow."""
 
-    
-await self.async_set_unique_id(device_unique_id)
-self._abort_if_unique_id_configured()
+class InvalidAuth(HomeAssistantError):
+    """Error to indicate there is invalid auth."""
 
-async def async_step_user(self, info):
-    if info is not None:
-        pass  # TODO: process info
 
-    return self.async_show_form(
-        step_id="user", data_schema=vol.Schema({vol.Required("username"): str, vol.Required("password"): str, vol.Required("conf_id"): str})
-    )
\ No newline at end of file
+class UnknownHeater(HomeAssistantError):
+    """Error to indicate the account has no such heater."""
@@ -0,0 +1,51 @@
+"""Constants for the Jollymec integration."""
+from datetime import time, timedelta
+
+DOMAIN = "jollymec"
+DEFAULT_NAME = "Jollymec"
+
+DATA_CLIENTS = "clients"
+DATA_COORDINATORS = "coordinators"
+DATA_SESSION_STORE = "session_store"
+DATA_TELEMETRY_STORE = "telemetry_store"
+DATA_CONSUMPTION_STORE = "consumption_store"
+DATA_SNAPSHOT_STORE = "snapshot_store"
+
+CONF_FAST_SCAN_INTERVAL = "fast_scan_interval"
+CONF_IDLE_SCAN_INTERVAL = "idle_scan_interval"
+CONF_MAINTENANCE_START = "maintenance_start"
+CONF_MAINTENANCE_DURATION = "maintenance_duration"
+CONF_TRAFFIC_MODE = "traffic_mode"
+CONF_TRAFFIC_FILE = "traffic_file"
+CONF_TELEMETRY_SAMPLES = "telemetry_samples"
+CONF_PERSIST_TELEMETRY = "persist_telemetry"
+CONF_PELLET_RATES = "pellet_rates"
+CONF_MAX_CONCURRENCY = "max_concurrent_requests"
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
+CONF_SMOKE_DEADBAND = "smoke_temperature_deadband"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_READ_TIMEOUT = "read_timeout"
+CONF_OPERATION_TIMEOUT = "operation_timeout"
+
+# Cloud traffic is either live, recorded to traffic_file or replayed from it
+TRAFFIC_LIVE = "live"
+TRAFFIC_RECORD = "record"
+TRAFFIC_REPLAY = "replay"
+TRAFFIC_FILE = "jollymec_traffic.jsonl.gz"
+
+SCAN_INTERVAL = timedelta(minutes=1)
+FAST_SCAN_INTERVAL = timedelta(seconds=15)
+IDLE_SCAN_INTERVAL = timedelta(minutes=5)
+# Confirmation polls after a command: first delay, doubled each time, and
+# the time after which unconfirmed commands are rolled back
+CONFIRM_FIRST_DELAY = timedelta(seconds=3)
+CONFIRM_TIMEOUT = timedelta(seconds=90)
+# Temperature moves smaller than this since the last state write are ignored
+TEMPERATURE_DEADBAND = 0.2
+SMOKE_DEADBAND = 2.0
+# Same for the pellet (kg) and burn time (h) totals and the trends (per hour)
+CONSUMPTION_DEADBAND = 0.01
+TREND_DEADBAND = 0.1
+# The efesto site goes down every night around 02:47
+MAINTENANCE_START = time(2, 45)
+MAINTENANCE_DURATION = timedelta(minutes=20)
@@ -0,0 +1,55 @@
+"""Pellet consumption and burn time, integrated poll by poll."""
+from .hajolly import Status
+
+# Pellet feed in kg/h at each power level, a typical 8-10 kW stove
+PELLET_RATES = {1: 0.6, 2: 0.9, 3: 1.2, 4: 1.5, 5: 1.9}
+BURNING_STATUSES = (Status.IGNITION, Status.ON)
+# Longer gaps between polls (restart, outage) are not integrated
+MAX_GAP = 1800
+
+
+class ConsumptionMeter(object):
+    """Running totals of pellets burnt (kg) and burn time (hours).
+
+    Each interval between two polls is credited with what the stove was
+    doing at its start, so a sample costs a couple of additions whatever
+    the history length. ``on_sample`` is called after every sample, e.g.
+    to schedule a save.
+    """
+
+    def __init__(self, rates=None):
+        self.rates = dict(rates or PELLET_RATES)
+        self.on_sample = None
+        self.pellets = 0.0
+        self.burn_hours = 0.0
+        self._last = None
+
+    def add(self, timestamp, status, real_power):
+        last = self._last
+        self._last = (timestamp, status in BURNING_STATUSES, real_power)
+        if last is not None:
+            elapsed = timestamp - last[0]
+            last_burning, last_power = last[1], last[2]
+            if 0 < elapsed <= MAX_GAP and last_burning:
+                hours = elapsed / 3600
+                self.burn_hours += hours
+                self.pellets += self.rates.get(last_power, 0.0) * hours
+        if self.on_sample is not None:
+            self.on_sample()
+
+    def as_dict(self):
+        return {
+            'pellets': self.pellets,
+            'burn_hours': self.burn_hours,
+            'last': self._last,
+        }
+
+    @classmethod
+    def from_dict(cls, data, rates=None):
+        meter = cls(rates)
+        if data:
+            meter.pellets = data.get('pellets', 0.0)
+            meter.burn_hours = data.get('burn_hours', 0.0)
+            if data.get('last'):
+                meter._last = tuple(data['last'])
+        return meter
@@ -0,0 +1,45 @@
+"""Local hysteresis control of a stove from an external room sensor."""
+import time
+
+# °C below and above the target before the stove is switched
+COLD_TOLERANCE = 0.3
+HOT_TOLERANCE = 0.3
+
+
+class HysteresisController(object):
+    """Decide when the stove should burn from a room temperature.
+
+    The stove is wanted on once the room is ``cold_tolerance`` below the
+    target and off once it is ``hot_tolerance`` above it; in between the
+    last decision holds, so sensor noise never reaches the cloud. A switch
+    less than ``min_cycle`` seconds after the previous one is postponed,
+    see ``blocked_for``.
+    """
+
+    def __init__(self, cold_tolerance=COLD_TOLERANCE, hot_tolerance=HOT_TOLERANCE, min_cycle=0.0,
+                 clock=time.monotonic):
+        self.cold_tolerance = cold_tolerance
+        self.hot_tolerance = hot_tolerance
+        self.min_cycle = min_cycle
+        self._clock = clock
+        # Clock time of the last switch, None before the first one
+        self._switched = None
+
+    def wanted(self, current, target, active):
+        """True or False when the stove should be switched on or off, None to leave it."""
+        if current is None or target is None:
+            return None
+        if active and current >= target + self.hot_tolerance:
+            return False
+        if not active and current <= target - self.cold_tolerance:
+            return True
+        return None
+
+    def blocked_for(self):
+        """Seconds before the minimum cycle allows the next switch."""
+        if self._switched is None:
+            return 0.0
+        return max(0.0, self._switched + self.min_cycle - self._clock())
+
+    def switched(self):
+        self._switched = self._clock()
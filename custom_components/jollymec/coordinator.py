@@ -0,0 +1,353 @@
+"""Update coordinator for Jollymec heating devices."""
+import asyncio
+from datetime import datetime, timedelta
+from functools import partial
+import logging
+from time import monotonic
+
+import aiohttp
+
+from homeassistant.const import CONF_ID, CONF_PASSWORD, CONF_SCAN_INTERVAL, CONF_USERNAME
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_CONNECT_TIMEOUT,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_IDLE_SCAN_INTERVAL,
+    CONF_MAINTENANCE_DURATION,
+    CONF_MAINTENANCE_START,
+    CONF_MAX_CONCURRENCY,
+    CONF_OPERATION_TIMEOUT,
+    CONF_PELLET_RATES,
+    CONF_PERSIST_TELEMETRY,
+    CONF_READ_TIMEOUT,
+    CONF_SMOKE_DEADBAND,
+    CONF_TELEMETRY_SAMPLES,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_TRAFFIC_FILE,
+    CONF_TRAFFIC_MODE,
+    CONFIRM_FIRST_DELAY,
+    CONFIRM_TIMEOUT,
+    CONSUMPTION_DEADBAND,
+    DATA_CLIENTS,
+    DATA_CONSUMPTION_STORE,
+    DATA_COORDINATORS,
+    DATA_SESSION_STORE,
+    DATA_SNAPSHOT_STORE,
+    DATA_TELEMETRY_STORE,
+    DOMAIN,
+    FAST_SCAN_INTERVAL,
+    IDLE_SCAN_INTERVAL,
+    MAINTENANCE_DURATION,
+    MAINTENANCE_START,
+    SCAN_INTERVAL,
+    SMOKE_DEADBAND,
+    TEMPERATURE_DEADBAND,
+    TRAFFIC_RECORD,
+    TRAFFIC_REPLAY,
+    TREND_DEADBAND,
+)
+from .consumption import ConsumptionMeter
+from .events import EVENT_JOLLYMEC, event_data, transitions
+from .hajolly import CircuitOpenError, Error as JollyMecError, JollyMecClient, Status, deadline, jollymec
+from .snapshot import DeviceSnapshot
+from .telemetry import TelemetryBuffer
+from .transport import HttpTransport, RecordingTransport, ReplayTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+TRANSITIONAL_STATUSES = (Status.IGNITION, Status.FINAL_CLEANING)
+IDLE_STATUSES = (Status.OFF, Status.STANDBY)
+
+
+class PollingScheduler(object):
+    """Choose the delay before the next get-state from what the stove is doing.
+
+    Transitional phases are polled fast, a stove that is off or in stand-by
+    slowly, and nothing is polled during the daily maintenance window of
+    the cloud. Commands are followed by their own confirmation polls, see
+    JollyMecCoordinator.async_command_sent. A poll refused by the circuit
+    breaker is tried again once the breaker lets a trial request through.
+    """
+
+    def __init__(
+        self,
+        interval=SCAN_INTERVAL,
+        fast_interval=FAST_SCAN_INTERVAL,
+        idle_interval=IDLE_SCAN_INTERVAL,
+        maintenance_start=MAINTENANCE_START,
+        maintenance_duration=MAINTENANCE_DURATION,
+    ):
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.maintenance_start = maintenance_start
+        self.maintenance_duration = maintenance_duration
+
+    def maintenance_remaining(self, now):
+        """Time left in the maintenance window at local time ``now``, or None."""
+        if self.maintenance_start is None or not self.maintenance_duration:
+            return None
+        start = datetime.combine(now.date(), self.maintenance_start, now.tzinfo)
+        # A window started yesterday may still be running after midnight
+        for window_start in (start, start - timedelta(days=1)):
+            end = window_start + self.maintenance_duration
+            if window_start <= now < end:
+                return end - now
+        return None
+
+    def next_interval(self, status, now, retry_after=None):
+        """Delay before the next poll; ``retry_after`` is the breaker's wait
+        after a poll it refused, never shorter than ``fast_interval``."""
+        remaining = self.maintenance_remaining(now)
+        if remaining is not None:
+            return remaining
+        if status in TRANSITIONAL_STATUSES:
+            interval = self.fast_interval
+        elif status in IDLE_STATUSES:
+            interval = min(self.idle_interval, self._until_maintenance(now))
+        else:
+            interval = self.interval
+        if retry_after is not None:
+            # A refused poll cost nothing, the cloud may be back already
+            interval = min(interval, max(timedelta(seconds=retry_after), self.fast_interval))
+        return interval
+
+    def _until_maintenance(self, now):
+        # Don't let a long idle interval skip the poll right after the window
+        if self.maintenance_start is None or not self.maintenance_duration:
+            return self.idle_interval
+        start = datetime.combine(now.date(), self.maintenance_start, now.tzinfo)
+        if start <= now:
+            start += timedelta(days=1)
+        return max(start - now, self.fast_interval)
+
+
+class JollyMecCoordinator(DataUpdateCoordinator):
+    """Poll one heater with a single get-state and share it between its entities.
+
+    A poll gets the current update interval as its time budget, retries and
+    re-logins included, so a slow cloud fails it before the next one is due.
+    Every successful poll is also appended to ``telemetry``, integrated by
+    the ``consumption`` meter and kept in ``snapshot``. A stored snapshot is
+    shown right away at startup, ``stale`` until a poll succeeds. Status
+    and alarm changes between two reported states fire a jollymec_event,
+    see events.transitions.
+    ``deadbands`` holds the change thresholds of the air and smoke
+    temperatures, consumption totals and trends used by the entities, see
+    JollyMecEntity. ``clock`` returns the local time polls are scheduled
+    and stamped with.
+    """
+
+    def __init__(self, hass, device, scheduler=None, telemetry=None, consumption=None, deadbands=None,
+                 snapshot=None, clock=dt_util.now):
+        self.scheduler = scheduler or PollingScheduler()
+        self.clock = clock
+        self.deadbands = {
+            'air_temperature': TEMPERATURE_DEADBAND,
+            'smoke_temperature': SMOKE_DEADBAND,
+            'consumption': CONSUMPTION_DEADBAND,
+            'trend': TREND_DEADBAND,
+        }
+        self.deadbands.update(deadbands or {})
+        self.telemetry = telemetry if telemetry is not None else TelemetryBuffer()
+        self.consumption = consumption if consumption is not None else ConsumptionMeter()
+        self.snapshot = snapshot if snapshot is not None else DeviceSnapshot()
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {device.heater_id}",
+            update_interval=self.scheduler.next_interval(device.status, clock()),
+        )
+        self.device = device
+        device.on_state_changed = self.async_update_listeners
+        self._confirm_task = None
+        self.stale = False
+        if self.snapshot.state is not None:
+            device.apply_state(self.snapshot.state)
+            self.data = device
+            self.stale = True
+
+    def async_command_sent(self):
+        """Poll until the cloud reports what was just commanded.
+
+        The device already shows the commanded values; confirmation polls
+        back off from a few seconds and stop as soon as nothing is pending.
+        Whatever is still pending at the deadline is rolled back.
+        """
+        if self._confirm_task is not None and not self._confirm_task.done():
+            self._confirm_task.cancel()
+        self._confirm_task = self.hass.async_create_background_task(
+            self._async_confirm(), f"{self.name} command confirmation"
+        )
+
+    async def async_shutdown(self):
+        if self._confirm_task is not None:
+            self._confirm_task.cancel()
+        await super().async_shutdown()
+
+    async def _async_confirm(self):
+        deadline = monotonic() + CONFIRM_TIMEOUT.total_seconds()
+        delay = CONFIRM_FIRST_DELAY.total_seconds()
+        while self.device.pending:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            delay *= 2
+            await self.async_refresh()
+        if self.device.pending:
+            _LOGGER.error(
+                "Heater %s did not confirm %s, rolling back",
+                self.device.heater_id,
+                ", ".join(self.device.pending),
+            )
+            self.device.rollback()
+
+    def _fire_transitions(self, previous, current):
+        for event_type in transitions(previous, current):
+            data = event_data(self.device.heater_id, event_type, previous, current)
+            _LOGGER.debug("Heater %s: %s", self.device.heater_id, data)
+            self.hass.bus.async_fire(EVENT_JOLLYMEC, data)
+
+    async def _async_update_data(self):
+        now = self.clock()
+        retry_after = None
+        try:
+            if self.scheduler.maintenance_remaining(now) is not None and self.data is not None:
+                _LOGGER.debug("Cloud maintenance window, skipping %s poll", self.device.heater_id)
+                return self.device
+            with deadline(self.update_interval.total_seconds(), self.device.client.clock):
+                await self.device.async_update()
+            self.telemetry.append(
+                now.timestamp(),
+                air_temperature=self.device.air_temperature,
+                smoke_temperature=self.device.gas_temperature,
+                real_power=self.device.real_power,
+            )
+            reported = self.device.reported
+            self.consumption.add(now.timestamp(), reported.status, reported.real_power)
+            previous = self.snapshot.state
+            self.snapshot.update(now.timestamp(), reported)
+            self._fire_transitions(previous, reported)
+            self.stale = False
+        except (JollyMecError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+            if isinstance(err, CircuitOpenError):
+                retry_after = self.device.client.breaker.retry_after
+            raise UpdateFailed(f"Error fetching {self.device.heater_id} state: {err}") from err
+        finally:
+            self.update_interval = self.scheduler.next_interval(self.device.status, now, retry_after)
+        return self.device
+
+
+async def _async_create_transport(hass, config):
+    """Transport for the traffic_mode and timeout options, files relative to the config dir."""
+    mode = config[CONF_TRAFFIC_MODE]
+    path = hass.config.path(config[CONF_TRAFFIC_FILE])
+    http = HttpTransport(config[CONF_CONNECT_TIMEOUT], config[CONF_READ_TIMEOUT])
+    if mode == TRAFFIC_RECORD:
+        _LOGGER.warning("Recording efesto cloud traffic to %s", path)
+        return RecordingTransport(http, path)
+    if mode == TRAFFIC_REPLAY:
+        _LOGGER.warning("Replaying efesto cloud traffic from %s", path)
+        return await hass.async_add_executor_job(ReplayTransport(path).load)
+    return http
+
+
+async def _async_get_client(hass, config):
+    """The client of the account of ``config``, shared by all its heaters.
+
+    Each account gets its own cookie jar over Home Assistant's pooled
+    connector, so accounts never log each other out. The session is
+    detached from the connector and the transport closed with the client,
+    see async_remove_coordinator and async_close_clients; Home Assistant
+    would tie the session to the entry that happened to create it.
+    """
+    username = config[CONF_USERNAME]
+    clients = hass.data[DOMAIN][DATA_CLIENTS]
+    client = clients.get(username.lower())
+    if client is not None:
+        client.password = config[CONF_PASSWORD]
+        return client
+
+    transport = await _async_create_transport(hass, config)
+    if username.lower() in clients:
+        # Another heater of the account got there while the file loaded
+        return clients[username.lower()]
+    client = clients[username.lower()] = JollyMecClient(
+        async_create_clientsession(hass, auto_cleanup=False),
+        username,
+        config[CONF_PASSWORD],
+        transport=transport,
+        max_concurrency=config[CONF_MAX_CONCURRENCY],
+        operation_timeout=config[CONF_OPERATION_TIMEOUT],
+    )
+    if not isinstance(transport, ReplayTransport):
+        # Replayed cookies are placeholders, keep the stored session intact
+        store = hass.data[DOMAIN][DATA_SESSION_STORE]
+        client.restore_cookies(store.async_get(username))
+        client.on_cookies_changed = partial(store.async_save, username)
+    return client
+
+
+async def async_create_coordinator(hass, config):
+    """Build the device and coordinator of one heater from its validated config.
+
+    Nothing is fetched here: the caller starts the first refresh in the
+    background, so setup never waits on the cloud. The traffic, timeout and
+    concurrency options of the first heater of an account apply to all of
+    them.
+    """
+    heater_id = config[CONF_ID]
+    data = hass.data[DOMAIN]
+    client = await _async_get_client(hass, config)
+    jolly = jollymec(client.email, client.password, heater_id, client=client)
+
+    scheduler = PollingScheduler(
+        config[CONF_SCAN_INTERVAL],
+        config[CONF_FAST_SCAN_INTERVAL],
+        config[CONF_IDLE_SCAN_INTERVAL],
+        config[CONF_MAINTENANCE_START],
+        config[CONF_MAINTENANCE_DURATION],
+    )
+    if config[CONF_PERSIST_TELEMETRY]:
+        telemetry = data[DATA_TELEMETRY_STORE].async_get(
+            heater_id, partial(TelemetryBuffer.from_dict, capacity=config[CONF_TELEMETRY_SAMPLES]))
+    else:
+        telemetry = TelemetryBuffer(config[CONF_TELEMETRY_SAMPLES])
+    consumption = data[DATA_CONSUMPTION_STORE].async_get(
+        heater_id, partial(ConsumptionMeter.from_dict, rates=config[CONF_PELLET_RATES]))
+    deadbands = {
+        'air_temperature': config[CONF_TEMPERATURE_DEADBAND],
+        'smoke_temperature': config[CONF_SMOKE_DEADBAND],
+    }
+    snapshot = data[DATA_SNAPSHOT_STORE].async_get(heater_id, DeviceSnapshot.from_dict)
+    coordinator = JollyMecCoordinator(
+        hass, jolly.device, scheduler, telemetry, consumption, deadbands, snapshot)
+    data[DATA_COORDINATORS][heater_id] = coordinator
+    return coordinator
+
+
+async def async_remove_coordinator(hass, heater_id):
+    """Stop polling a heater, dropping its account client once unused."""
+    data = hass.data[DOMAIN]
+    coordinator = data[DATA_COORDINATORS].pop(heater_id)
+    await coordinator.async_shutdown()
+    client = coordinator.device.client
+    if all(other.device.client is not client for other in data[DATA_COORDINATORS].values()):
+        data[DATA_CLIENTS].pop(client.email.lower(), None)
+        await _async_close_client(hass, client)
+
+
+async def async_close_clients(hass, event=None):
+    """Release the account clients still in use, on shutdown."""
+    clients = hass.data[DOMAIN][DATA_CLIENTS]
+    await asyncio.gather(*(_async_close_client(hass, client) for client in clients.values()))
+
+
+async def _async_close_client(hass, client):
+    client.session.detach()
+    # A recording is flushed to its file
+    await hass.async_add_executor_job(client.transport.close)
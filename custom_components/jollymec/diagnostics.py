@@ -0,0 +1,36 @@
+"""Diagnostics support for Jollymec."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_ID, CONF_PASSWORD, CONF_USERNAME
+
+from .const import DATA_COORDINATORS, DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+def _coordinator_diagnostics(coordinator):
+    device = coordinator.device
+    client = device.client
+    return {
+        "state": {name: getattr(device.state, name) for name in device.state.__slots__},
+        "pending": device.pending,
+        "update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval else None,
+        "last_update_success": coordinator.last_update_success,
+        "stale": coordinator.stale,
+        "snapshot_timestamp": coordinator.snapshot.timestamp,
+        "circuit_breaker": {
+            "state": client.breaker.state,
+            "retry_after": client.breaker.retry_after,
+        },
+        "metrics": client.metrics.as_dict(),
+        "telemetry": coordinator.telemetry.stats(),
+        "consumption": coordinator.consumption.as_dict(),
+    }
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][DATA_COORDINATORS][entry.data[CONF_ID]]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "heater": _coordinator_diagnostics(coordinator),
+    }
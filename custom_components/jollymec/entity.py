@@ -0,0 +1,67 @@
+"""Base entity for Jollymec heating devices."""
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+
+class JollyMecEntity(CoordinatorEntity):
+    """Coordinator entity writing its state only when something changed.
+
+    Polls mostly return what the previous one did; an identical write still
+    costs an attribute rebuild, a state machine comparison and, for
+    attribute noise, a recorder row. ``_deadbands`` maps state or attribute
+    names to a coordinator deadband key: such values have to move by more
+    than the deadband since the last write to count as a change.
+    Attributes in ``_volatile`` are written but never trigger a write.
+    """
+
+    _deadbands = {}
+    _volatile = frozenset()
+    _published = None
+
+    @property
+    def available(self):
+        # Entities are added before the first poll, which runs in the background.
+        # A restored snapshot stays shown, flagged stale, until a poll succeeds.
+        coordinator = self.coordinator
+        if coordinator.data is None:
+            return False
+        return coordinator.last_update_success or coordinator.stale
+
+    def _snapshot(self):
+        snapshot = {'available': self.available, 'state': self.state}
+        snapshot.update(self.state_attributes or {})
+        snapshot.update(self.extra_state_attributes or {})
+        return snapshot
+
+    def _changed(self, snapshot):
+        published = self._published
+        if published is None or published.keys() != snapshot.keys():
+            return True
+        deadbands = self.coordinator.deadbands
+        for key, value in snapshot.items():
+            old = published[key]
+            if value == old or key in self._volatile:
+                continue
+            band = deadbands.get(self._deadbands.get(key))
+            if band and _within(old, value, band):
+                continue
+            return True
+        return False
+
+    @callback
+    def _handle_coordinator_update(self):
+        if self._changed(self._snapshot()):
+            self.async_write_ha_state()
+
+    @callback
+    def async_write_ha_state(self):
+        # Commands write directly too, keep the reference in step
+        super().async_write_ha_state()
+        self._published = self._snapshot()
+
+
+def _within(old, new, band):
+    try:
+        return abs(float(new) - float(old)) < band
+    except (TypeError, ValueError):
+        return False
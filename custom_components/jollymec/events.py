@@ -0,0 +1,51 @@
+"""Home Assistant bus events fired on heater status transitions."""
+from .hajolly import Status
+
+# Event type fired on the bus, ``type`` in its data tells what happened
+EVENT_JOLLYMEC = "jollymec_event"
+
+ALARM_RAISED = "alarm_raised"
+ALARM_CLEARED = "alarm_cleared"
+IGNITION_STARTED = "ignition_started"
+IGNITION_FINISHED = "ignition_finished"
+STANDBY = "standby"
+FINAL_CLEANING = "final_cleaning"
+
+
+def transitions(previous, current):
+    """Event types between two reported DeviceStates, in the order they happened.
+
+    Only edges count: a state reported again fires nothing, and neither
+    does the first state of a heater with no previous one to compare to.
+    An alarm replacing another one clears it before being raised.
+    """
+    if previous is None or current is None:
+        return []
+    types = []
+    if previous.alarm is not None and previous.alarm != current.alarm:
+        types.append(ALARM_CLEARED)
+    if previous.status == Status.IGNITION and current.status != Status.IGNITION:
+        types.append(IGNITION_FINISHED)
+    if current.status == Status.IGNITION and previous.status != Status.IGNITION:
+        types.append(IGNITION_STARTED)
+    if current.status == Status.STANDBY and previous.status != Status.STANDBY:
+        types.append(STANDBY)
+    if current.status == Status.FINAL_CLEANING and previous.status != Status.FINAL_CLEANING:
+        types.append(FINAL_CLEANING)
+    if current.alarm is not None and current.alarm != previous.alarm:
+        types.append(ALARM_RAISED)
+    return types
+
+
+def event_data(heater_id, event_type, previous, current):
+    """Data of one event, with the decoded alarm text."""
+    # A cleared alarm is described by the one that went away
+    alarm = previous.alarm if event_type == ALARM_CLEARED else current.alarm
+    return {
+        'heater_id': heater_id,
+        'type': event_type,
+        'status': current.status.value if current.status is not None else None,
+        'previous_status': previous.status.value if previous.status is not None else None,
+        'status_code': current.status_code,
+        'alarm': alarm,
+    }
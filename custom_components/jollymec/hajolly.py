@@ -1,257 +1,814 @@
 """py_jollymec provides controlling heating devices connected via
 the IOT Agua platform of Micronova
 """
-from os import ST_APPEND
-import sys
-import requests
-import json
 import asyncio
-import os.path
-import pickle
-import time
+import contextlib
+import contextvars
+import enum
+import hashlib
+import json
 import logging
+import time
+
+import aiohttp
+from yarl import URL
+
+from .metrics import ClientMetrics
+from .ratelimit import RateLimitedLogger
+from .retry import CircuitBreaker, RetryPolicy
+from .transport import HttpTransport
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
-logging.basicConfig(filename='/custom_components/jollymec_test/tmp/jollymec.log', format='%(asctime)s %(message)s', level=logging.ERROR)
 _LOGGER = logging.getLogger(__name__)
-cookieFile = "./jollymec_cookies.bin"
-
-loginurl = 'http://jollymec.efesto.web2app.it/fr/login/'
-ajaxurl = 'http://jollymec.efesto.web2app.it/fr/ajax/action/frontend/response/ajax/'
-username = "test@test.com"
-password = "MyPassword"
-heaterId = "MyHeaterId"
-retrycount  = 1
-retrycounter = 0
-
-session = requests.Session()
-
-def save_cookies(requests_cookiejar, filename):
-    with open(filename, 'wb') as f:
-        pickle.dump(requests_cookiejar, f)
-
-def load_cookies(filename):
-    with open(filename, 'rb') as f:
-        return pickle.load(f)
-
-def login( username, password ):
-    payload = {
-        'login[username]': username, 
-        'login[password]': password}
-    
-    loginHeaders = {
+# Retries and failed logins repeat for as long as an outage lasts
+_THROTTLED_LOGGER = RateLimitedLogger(_LOGGER)
+
+baseurl = 'http://jollymec.efesto.web2app.it'
+LOGIN_PATH = '/fr/login/'
+AJAX_PATH = '/fr/ajax/action/frontend/response/ajax/'
+loginurl = baseurl + LOGIN_PATH
+ajaxurl = baseurl + AJAX_PATH
+
+# ASCII tail of "<title>Problèmes de communication</title>", found whatever
+# charset the error page is served in
+COMM_ERROR_MARKER = b"de communication</title>"
+JSON_CONTENT_TYPES = ('application/json', 'text/javascript', 'application/javascript')
+WRITE_DEBOUNCE = 1.0
+# Longest part of a reply body quoted in errors and logs
+MAX_QUOTED_BODY = 200
+# Requests in flight at once per account
+MAX_CONCURRENCY = 4
+# Seconds one cloud call may take in total, retries included
+OPERATION_TIMEOUT = 60.0
+# Read-only ajax methods, shared between concurrent callers
+READ_METHODS = ('get-state',)
+# Seconds a fetched state is served again to later readers
+STATE_MAX_AGE = 2.0
+
+# Monotonic time by which the cloud calls of the current task must be done
+_deadline = contextvars.ContextVar('jollymec_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds, clock=time.monotonic):
+    """Give the cloud calls made in the block ``seconds`` in total.
+
+    Covers logins and retries too; a nested block can only shorten the
+    budget. Calls that run out raise DeadlineExceeded. ``clock`` must be
+    the clock of the client making the calls.
+    """
+    when = clock() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(when if outer is None else min(when, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def login_headers(base_url=baseurl):
+    return {
         'Content-Type': 'application/x-www-form-urlencoded',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-        'Referer': 'http://jollymec.efesto.web2app.it/fr/login/'}
+        'Referer': base_url + LOGIN_PATH}
 
-    response = postSession(loginurl, data=payload, headers=loginHeaders)
 
-    _LOGGER.debug("Login successfull, cookies saved. %s", os.environ['PWD'])
+def command_headers(heaterId, base_url=baseurl):
+    return {
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'X-Requested-With': 'XMLHttpRequest',
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'Referer': base_url + '/fr/heaters/action/manage/heater/' + heaterId + '/',
+        'Origin': base_url}
 
-    if response.status_code == 200:
-        save_cookies(session.cookies, cookieFile)
-        _LOGGER.debug("Login successfull, cookies saved. %s", session.cookies)
-        return { 'state': "OK" }
-    else:
-        logging.error("Login failed, status code: %s", response.status_code)
-        return { 'state': "LOGIN STATUS CODE " + str(response.status_code) }
 
-def postSession( url, data, headers ):
-    global retrycounter
-    response = session.post(url=url, data=data, headers=headers)
-    #_LOGGER.debug("postsession %s", response.text)
-        
+def is_comm_error(response, body):
+    """Whether the cloud answered with its communication error page."""
+    if response.content_type in JSON_CONTENT_TYPES:
+        return False
+    return COMM_ERROR_MARKER in body
 
-    if "<title>Problèmes de communication</title>" in response.text and retrycounter<5:
-        retrycounter = retrycounter + 1
-        logging.warn("Communications error, trying again (retry %s of 5)", retrycounter)
-        time.sleep(5)
-        return postSession( url, data, headers )
-    else:
-        return response
-
-def main( username, password):
-
-    #Check if cookie file exists
-    if os.path.isfile(cookieFile):
-        session.cookies = load_cookies(cookieFile)
-    else:
-        #Login if file does not exists
-            result = login(username, password)
-            # _LOGGER.debug("resultat login %s", result)
-
-    return
-
-def command_jollymec(method, param, heaterId):
-    payload = {
-        'method': method, 
-        'params': param,
-        'device': heaterId}
-        
-    commandHeaders = {
-         'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-         'X-Requested-With': 'XMLHttpRequest',
-         'Accept': 'application/json, text/javascript, */*; q=0.01',
-         'Referer': 'http://jollymec.efesto.web2app.it/fr/heaters/action/manage/heater/' + heaterId + '/',
-         'Origin': 'http://jollymec.efesto.web2app.it'}
-    
-    #_LOGGER.debug("payload %s", payload)
-    response = postSession(ajaxurl, payload, commandHeaders)
-    #_LOGGER.debug("response get_state %s", response.text)
 
-    if response.status_code == 200:
-        try:
-            responseData = json.loads(response.text)
-            
-            if responseData["status"] == 0:
-                return {
-                    'state': "OK", 
-                    'data': json.dumps(responseData["message"])
-                }
-
-            elif responseData["status"] == 1:
-                return { 'state': "NOT LOGGED IN" }
+def quote_body(body):
+    """Start of a reply body for messages, whole pages are not worth logging."""
+    text = body[:MAX_QUOTED_BODY].decode('utf-8', 'replace')
+    return text + '...' if len(body) > MAX_QUOTED_BODY else text
+
+
+def handleValueError( moduleName, body ):
+    errorText = "Error parsing json in {}, response: {}".format(moduleName, quote_body(body))
+    _THROTTLED_LOGGER.error('parse', "%s", errorText)
+    return { 'state': errorText }
+
+
+class JollyMecClient(object):
+    """Asynchronous client for the efesto web2app cloud.
+
+    All calls run on the event loop and share the keep-alive connection
+    pool of the given aiohttp session. The authenticated cookies live in the
+    session's cookie jar; ``on_cookies_changed`` is called with the new
+    cookies whenever the cloud changes them, so the caller can persist them.
+    Requests go through ``transport``, which can record or replay them.
+
+    One client serves every heater of an account: they share its cookies,
+    retry and breaker state, and at most ``max_concurrency`` requests are in
+    flight at once. Each call gives up after ``operation_timeout`` seconds,
+    or earlier within a ``deadline`` block.
+
+    Concurrent reads of the same heater share one request, and a successful
+    read is served again for ``state_max_age`` seconds; any other command to
+    the heater drops what was read before it.
+
+    Deadlines and the freshness window are measured with ``clock``; latency
+    metrics always use real time.
+    """
+
+    def __init__(self, session, email, password, retry_policy=None, breaker=None, base_url=None,
+                 transport=None, max_concurrency=MAX_CONCURRENCY, operation_timeout=OPERATION_TIMEOUT,
+                 state_max_age=STATE_MAX_AGE, clock=time.monotonic):
+        self._session = session
+        self._owns_session = session is None
+        self.email = email
+        self.password = password
+        self.base_url = base_url or baseurl
+        self.metrics = ClientMetrics()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(failure_threshold=self.retry_policy.retries + 1)
+        self.transport = transport or HttpTransport()
+        self.operation_timeout = operation_timeout
+        self.state_max_age = state_max_age
+        self.clock = clock
+        self.on_cookies_changed = None
+        self._cookies = {}
+        # Bumped by every successful login, see _async_relogin
+        self._generation = 0
+        self._login_lock = asyncio.Lock()
+        self._last_states = {}
+        # (heater, method) -> task of the read in flight / (time, result)
+        self._reads = {}
+        self._fresh = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+            self._owns_session = True
+        return self._session
+
+    async def async_close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+
+    async def async_post(self, url, data, headers, method='post'):
+        """Post to the cloud, retrying on network errors and while the site
+        reports a communication error.
+
+        Raises CircuitOpenError without touching the network while the
+        circuit breaker is open, ConnectionError once the retries are
+        exhausted and DeadlineExceeded when the time budget of the call runs
+        out, waiting for a free slot included. The latency of every attempt is
+        recorded under ``method``. Only requests that were sent count for the
+        circuit breaker, the wait for a slot does not.
+        """
+        metrics = self.metrics
+        retries = self.retry_policy.retries
+        expires = self.clock() + self.operation_timeout
+        if _deadline.get() is not None:
+            expires = min(expires, _deadline.get())
+        error = None
+        for attempt in range(retries + 1):
+            if self.breaker.retry_after > 0:
+                # Open: refused without waiting for a slot
+                self._refuse(error)
+            now = self.clock()
+            if now >= expires:
+                metrics.error('deadline')
+                raise DeadlineExceeded("No time left for the request") from error
+            sent = False
+            try:
+                async with asyncio.timeout(expires - now) as budget:
+                    async with self._semaphore:
+                        # A half-open breaker lets its trial through only once it can be sent
+                        if not self.breaker.allow_request():
+                            self._refuse(error)
+                        sent = True
+                        start = time.monotonic()
+                        response, body = await self.transport.async_post(self.session, url, data, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if not sent:
+                    metrics.error('deadline')
+                    raise DeadlineExceeded("No free request slot before the time budget ran out") from err
+                metrics.observe(method, time.monotonic() - start)
+                metrics.error('network', repr(err))
+                self.breaker.record_failure()
+                if budget.expired():
+                    metrics.error('deadline')
+                    raise DeadlineExceeded("Request timed out, time budget spent") from err
+                error, reason, key = err, "Network error ({!r})".format(err), 'network'
             else:
-                return { 'state': "GET STATE STATUS NOT OK:" + response.text }
+                metrics.observe(method, time.monotonic() - start)
+                self._check_cookies()
+                if not is_comm_error(response, body):
+                    self.breaker.record_success()
+                    return response, body
+                metrics.error('comm_error')
+                self.breaker.record_failure()
+                error, reason, key = None, "Communications error", 'comm_error'
+            if self.breaker.is_open:
+                break
+            if attempt < retries:
+                if not await self.retry_policy.async_sleep(attempt, expires):
+                    metrics.error('deadline')
+                    raise DeadlineExceeded(
+                        "{}, no time left for retry {} of {}".format(reason, attempt + 1, retries)) from error
+                _THROTTLED_LOGGER.warning(
+                    key, "%s, trying again (retry %s of %s)", reason, attempt + 1, retries)
+                metrics.increment('retries')
+        if self.breaker.is_open:
+            raise CircuitOpenError(
+                "{}, cloud considered down for {:.0f}s".format(reason, self.breaker.retry_after)) from error
+        raise ConnectionError("{}, giving up after {} retries".format(reason, retries)) from error
+
+    def _refuse(self, error):
+        self.metrics.error('circuit_open')
+        raise CircuitOpenError(
+            "Cloud unavailable, next try in {:.0f}s".format(self.breaker.retry_after)) from error
+
+    async def async_login(self):
+        payload = {
+            'login[username]': self.email,
+            'login[password]': self.password}
+
+        self.metrics.increment('logins')
+        response, body = await self.async_post(
+            self.base_url + LOGIN_PATH, payload, login_headers(self.base_url), 'login')
+
+        if response.status == 200:
+            _LOGGER.debug("Login successfull.")
+            self._generation += 1
+            self.metrics.success('login')
+            return { 'state': "OK" }
+        else:
+            _THROTTLED_LOGGER.error('login', "Login failed, status code: %s", response.status)
+            self.metrics.error('login', str(response.status))
+            return { 'state': "LOGIN STATUS CODE " + str(response.status) }
+
+    def restore_cookies(self, cookies):
+        """Put previously persisted session cookies back in the jar."""
+        if not cookies:
+            return
+        self.session.cookie_jar.update_cookies(cookies, URL(self.base_url))
+        self._cookies = dict(cookies)
+
+    async def async_ensure_session(self):
+        """Log in unless the session already holds cookies."""
+        if not self._cookies:
+            await self._async_relogin(self._generation)
+
+    async def _async_relogin(self, generation):
+        """Log in once for every caller that saw session ``generation`` fail.
+
+        Concurrent callers queue on the lock; the first one logs in and the
+        others find the generation already bumped and return at once.
+        """
+        async with self._login_lock:
+            if self._generation != generation:
+                return
+            result = await self.async_login()
+            if result['state'] != "OK":
+                raise UnauthorizedError(result['state'])
+
+    def _check_cookies(self):
+        cookies = {cookie.key: cookie.value for cookie in self.session.cookie_jar}
+        if cookies == self._cookies:
+            return
+        self._cookies = cookies
+        if self.on_cookies_changed is not None:
+            self.on_cookies_changed(cookies)
+
+    async def async_command(self, method, param, heaterId):
+        """Send one ajax command; reads are shared, see _async_shared_read."""
+        if method in READ_METHODS:
+            return await self._async_shared_read(method, param, heaterId)
+        self._forget_reads(heaterId)
+        try:
+            return await self._async_command_once(method, param, heaterId)
+        finally:
+            self._forget_reads(heaterId)
+
+    async def _async_shared_read(self, method, param, heaterId):
+        """Join the read of ``method`` in flight for the heater, or start it.
+
+        Waiters are shielded from each other: one being cancelled does not
+        cancel the request the others wait on. The read runs outside the
+        deadline of the caller that started it, within operation_timeout,
+        and each waiter gives up at its own deadline.
+        """
+        key = (heaterId, method)
+        fresh = self._fresh.get(key)
+        if fresh is not None and self.clock() - fresh[0] < self.state_max_age:
+            self.metrics.increment('fresh_reads')
+            return fresh[1]
+        task = self._reads.get(key)
+        if task is None:
+            context = contextvars.copy_context()
+            context.run(_deadline.set, None)
+            task = self._reads[key] = asyncio.get_running_loop().create_task(
+                self._async_read(key, method, param, heaterId), context=context)
+        else:
+            self.metrics.increment('shared_reads')
+        expires = _deadline.get()
+        if expires is None:
+            return await asyncio.shield(task)
+        try:
+            async with asyncio.timeout(max(0.0, expires - self.clock())) as budget:
+                return await asyncio.shield(task)
+        except asyncio.TimeoutError:
+            if not budget.expired():
+                raise
+            self.metrics.error('deadline')
+            raise DeadlineExceeded("No time left waiting for the shared {}".format(method)) from None
+
+    async def _async_read(self, key, method, param, heaterId):
+        try:
+            result = await self._async_command_once(method, param, heaterId)
+        finally:
+            # A command sent meanwhile has already dropped this read
+            current = self._reads.get(key) is asyncio.current_task()
+            if current:
+                del self._reads[key]
+        if current and result['state'] == "OK":
+            self._fresh[key] = (self.clock(), result)
+        return result
+
+    def _forget_reads(self, heaterId):
+        """Make later reads of the heater go to the cloud, a command changes its state."""
+        for key in [key for key in self._reads if key[0] == heaterId]:
+            del self._reads[key]
+        for key in [key for key in self._fresh if key[0] == heaterId]:
+            del self._fresh[key]
+
+    async def _async_command_once(self, method, param, heaterId):
+        """Send the command, logging in again and replaying it once if the
+        session has expired.
+        """
+        generation = self._generation
+        result = await self._async_command(method, param, heaterId)
+        if result['state'] == "NOT LOGGED IN":
+            _LOGGER.debug("Session expired, logging in again to replay %s", method)
+            self.metrics.increment('replays')
+            await self._async_relogin(generation)
+            result = await self._async_command(method, param, heaterId)
+        return result
+
+    async def _async_command(self, method, param, heaterId):
+        """Send one ajax command and decode its reply.
+
+        The body is decoded once and ``data`` holds the message as a dict.
+        A get-state reply also carries the ``digest`` of its body, and a body
+        identical to the previous one for the same heater is not decoded
+        again: the cached message is returned.
+        """
+        payload = {
+            'method': method,
+            'params': param,
+            'device': heaterId}
+
+        response, body = await self.async_post(
+            self.base_url + AJAX_PATH, payload, command_headers(heaterId, self.base_url), method)
+
+        if response.status != 200:
+            self.metrics.error('http_status', str(response.status))
+            return {'state': "GET STATE STATUS CODE " + str(response.status) }
+
+        digest = None
+        if method == 'get-state':
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            last = self._last_states.get(heaterId)
+            if last is not None and last[0] == digest:
+                self.metrics.success(method)
+                return { 'state': "OK", 'data': last[1], 'digest': digest }
+
+        try:
+            responseData = json_loads(body)
         except ValueError:
-            return handleValueError(method, response)
-    else:
-        return {'state': "GET STATE STATUS CODE " + str(response.status_code) }
+            self.metrics.error('parse', method)
+            return handleValueError(method, body)
+
+        if responseData["status"] == 0:
+            self.metrics.success(method)
+            message = responseData["message"]
+            if digest is None:
+                return { 'state': "OK", 'data': message }
+            self._last_states[heaterId] = (digest, message)
+            return { 'state': "OK", 'data': message, 'digest': digest }
+        elif responseData["status"] == 1:
+            self.metrics.increment('not_logged_in')
+            return { 'state': "NOT LOGGED IN" }
+        else:
+            self.metrics.error('status', method)
+            return { 'state': "GET STATE STATUS NOT OK:" + quote_body(body) }
+
+    async def async_get_state(self, heaterId):
+        return await self.async_command('get-state', '1', heaterId)
+
+    async def async_heater_on(self, heaterId):
+        return await self.async_command('heater-on', '1', heaterId)
+
+    async def async_heater_off(self, heaterId):
+        return await self.async_command('heater-off', '1', heaterId)
+
+    async def async_write_parameters(self, heaterId, param):
+        return await self.async_command('write-parameters-queue', param, heaterId)
+
+
+class ParameterWriteQueue(object):
+    """Debounce and merge the write-parameters-queue commands of one heater.
+
+    Writes issued within ``delay`` seconds of each other are sent together;
+    when the same parameter is written several times only the last value
+    goes to the cloud. The endpoint takes one parameter per call, so a
+    flush costs one round trip per distinct parameter.
+    """
+
+    def __init__(self, client, heater_id, delay=WRITE_DEBOUNCE):
+        self._client = client
+        self._heater_id = heater_id
+        self._delay = delay
+        self._pending = {}
+        self._waiters = []
+        self._timer = None
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+
+    async def async_write(self, name, value):
+        """Queue ``name=value`` and wait until the flush carrying it is done."""
+        loop = asyncio.get_running_loop()
+        self._pending[name] = value
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(self._delay, self._start_flush)
+        return await waiter
+
+    def _start_flush(self):
+        self._timer = None
+        pending, self._pending = self._pending, {}
+        waiters, self._waiters = self._waiters, []
+        task = asyncio.ensure_future(self._async_flush(pending, waiters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _async_flush(self, pending, waiters):
+        # The lock keeps flushes in order when a new one starts while the
+        # previous is still waiting on the cloud
+        async with self._lock:
+            try:
+                await self._client.async_ensure_session()
+                for name, value in pending.items():
+                    _LOGGER.debug("write-parameters-queue %s=%s", name, value)
+                    result = await self._client.async_write_parameters(self._heater_id, name + '=' + str(value))
+                    if result['state'] != "OK":
+                        raise ConnectionError(result['state'])
+            except Exception as err:  # pylint: disable=broad-except
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(err)
+                return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(True)
 
-def handleValueError( moduleName, response ):
-    errorText = "Error parsing json in {}, response: {}".format(moduleName, response.text)
-    logging.error(errorText)
-    return { 'state': errorText }
 
 class jollymec(object):
     """Provides access to jollymec platform."""
 
 
-    def __init__(self, email, password, heater_id):
-        """jollymec_cls object constructor"""
+    def __init__(self, email, password, heater_id, session=None, base_url=None, transport=None, client=None):
+        """jollymec_cls object constructor
+
+        Heaters of the same account should be given the same ``client``.
+        """
 
         self.email = email 
         self.password = password 
         self.heater_id = heater_id
         #self.unique_id = unique_id
+        self.client = client or JollyMecClient(session, email, password, base_url=base_url, transport=transport)
         self.devices = list()
-        self._fetch_data()
-
-    def _fetch_data(self):
-        self.fetch_data()
-
-    def fetch_data(self):
-        main(self.email, self.password)
-        result = command_jollymec('get-state', '1', self.heater_id)
-        #_LOGGER.debug("affichage info %s", result['data'])
-        if result["state"] == "NOT LOGGED IN":
-            _LOGGER.debug("State NOT LOGGED IN")
-        #Login expired, trying one time to log in again
-            login(username, password)
-        # _LOGGER.debug("Affichage du resultat %s", result) 
-        responseData = json.loads(result['data']) 
-        
-
-        dev= responseData
 
-        self.devices.append(
-             Device(
-                 dev,
-                 self
-               )
-           )
-        # _LOGGER.debug("temp sortie Device : %s", dev['airTemperature'])
+    async def async_fetch_data(self):
+        # One Device per heater: a new fetch replaces its snapshot
+        await self.device.async_update()
         return True
 
+    @property
+    def device(self):
+        """The heater, created without any state before the first fetch."""
+        if not self.devices:
+            self.devices.append(Device(DeviceState(), self))
+        return self.devices[0]
+
+
+ALARMS = ['', 'Black out', 'Sonde fumées', 'Hot fumées', 'Aspirateur en panne', 'Manque allumage', 'Finit pellet', 'Sécurité thermique', 'Manque dépression', 'Tirage minimum', 'Erreur vis sans fin', 'Encoder vis sans fin', 'Flamme en panne', 'Sécurité pellet', 'Sécurité carte', 'Service 24h', 'Sonde Ambiante', 'Niveau pellet']
+STATUS_TRANSLATED = ['OFF', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'ON', 'ON', 'Nettoyage Final', 'Stand-by', 'Stand-by', 'Alarme', 'Alarme']
+STATUS_ALARMS = [12, 13, 101]
+
+
+class Status(str, enum.Enum):
+    """Translated device status, compares equal to its label."""
+
+    OFF = 'OFF'
+    IGNITION = 'Allumage'
+    ON = 'ON'
+    FINAL_CLEANING = 'Nettoyage Final'
+    STANDBY = 'Stand-by'
+    ALARM = 'Alarme'
+
+    def __str__(self):
+        return self.value
+
+    @property
+    def code(self):
+        """First device status code translated to this status."""
+        return STATUS_TRANSLATED.index(self.value)
+
+    @classmethod
+    def from_code(cls, code):
+        if 0 <= code < len(STATUS_TRANSLATED):
+            return cls(STATUS_TRANSLATED[code])
+        if code in STATUS_ALARMS:
+            return cls.ALARM
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DeviceState(object):
+    """Immutable snapshot of the get-state fields used by the integration.
+
+    Everything is converted and decoded once when the reply is parsed, so
+    reading a field is a plain attribute access.
+    """
+
+    __slots__ = (
+        'air_temperature',
+        'smoke_temperature',
+        'target_temperature',
+        'set_power',
+        'real_power',
+        'status_code',
+        'status',
+        'alarm',
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    @classmethod
+    def from_message(cls, message):
+        status_code = _to_int(message.get('deviceStatus'))
+        alarm = None
+        if status_code in STATUS_ALARMS and message.get('isDeviceInAlarm'):
+            alarm = ALARMS[status_code] if status_code < len(ALARMS) else 'Alarme {}'.format(status_code)
+        return cls(
+            air_temperature=_to_float(message.get('airTemperature')),
+            smoke_temperature=_to_float(message.get('smokeTemperature')),
+            target_temperature=_to_float(message.get('lastSetAirTemperature')),
+            set_power=_to_int(message.get('lastSetPower')),
+            real_power=_to_int(message.get('realPower')),
+            status_code=status_code,
+            status=Status.from_code(status_code) if status_code is not None else None,
+            alarm=alarm,
+        )
+
+    def as_dict(self):
+        """Plain fields for storage, ``status`` follows from ``status_code``."""
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'status'}
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {name: data.get(name) for name in cls.__slots__ if name != 'status'}
+        status_code = fields['status_code']
+        fields['status'] = Status.from_code(status_code) if status_code is not None else None
+        return cls(**fields)
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed.
+
+        ``status`` and ``status_code`` stay consistent: changing one of them
+        alone derives the other.
+        """
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        if 'status' in changes and 'status_code' not in changes:
+            status = changes['status']
+            fields['status_code'] = Status(status).code if status is not None else None
+        elif 'status_code' in changes and 'status' not in changes:
+            code = changes['status_code']
+            fields['status'] = Status.from_code(code) if code is not None else None
+        return DeviceState(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DeviceState is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("DeviceState is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceState):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return 'DeviceState({})'.format(
+            ', '.join('{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
 
 class Device(object):
     """Jollymec heating device representation"""
 
-    ALARMS = ['', 'Black out', 'Sonde fumées', 'Hot fumées', 'Aspirateur en panne', 'Manque allumage', 'Finit pellet', 'Sécurité thermique', 'Manque dépression', 'Tirage minimum', 'Erreur vis sans fin', 'Encoder vis sans fin', 'Flamme en panne', 'Sécurité pellet', 'Sécurité carte', 'Service 24h', 'Sonde Ambiante', 'Niveau pellet']
-    STATUS_TRANSLATED = ['OFF', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'Allumage', 'ON', 'ON', 'Nettoyage Final', 'Stand-by', 'Stand-by', 'Alarme', 'Alarme']
-    STATUS_ALARMS = [12, 13, 101]
+    ALARMS = ALARMS
+    STATUS_TRANSLATED = STATUS_TRANSLATED
+    STATUS_ALARMS = STATUS_ALARMS
 
-    def __init__(self, device,
+    def __init__(self, state,
                   jollymec):
-        self._device= device
+        self.state = state
         self._jollymec = jollymec
+        self._writer = ParameterWriteQueue(jollymec.client, jollymec.heater_id)
+        # Last state reported by the cloud, ``state`` may overlay pending commands
+        self._reported = state
+        # Digest of the get-state body ``_reported`` was parsed from. The
+        # client is shared, so a body it has seen may still be new here
+        self._digest = None
+        # field -> (optimistic value, predicate telling if the cloud reports it)
+        self._pending = {}
+        self.on_state_changed = None
+
+    @property
+    def pending(self):
+        """Fields written locally that the cloud has not reported yet."""
+        return list(self._pending)
 
+    @property
+    def reported(self):
+        """Last state reported by the cloud, without pending commands."""
+        return self._reported
+
+    def apply_state(self, reported):
+        """Take a state reported by the cloud, keeping still-pending commands on top."""
+        self._reported = reported
+        for field, (value, confirmed) in list(self._pending.items()):
+            if confirmed(reported):
+                _LOGGER.debug("%s confirmed by the cloud", field)
+                del self._pending[field]
+        if self._pending:
+            reported = reported.replace(**{field: value for field, (value, _) in self._pending.items()})
+        self.state = reported
+
+    def rollback(self, field=None):
+        """Drop pending commands (all of them by default) and show the reported state."""
+        if field is None:
+            self._pending.clear()
+        else:
+            self._pending.pop(field, None)
+        self.apply_state(self._reported)
+        self._state_changed()
+
+    def _set_pending(self, field, value, confirmed):
+        self._pending[field] = (value, confirmed)
+        self.state = self.state.replace(**{field: value})
+        self._state_changed()
+
+    def _state_changed(self):
+        if self.on_state_changed is not None:
+            self.on_state_changed()
+
+    async def _async_optimistic(self, field, value, confirmed, command):
+        """Show ``value`` right away, then send ``command`` and undo on failure."""
+        self._set_pending(field, value, confirmed)
+        try:
+            await command
+        except BaseException:
+            self.rollback(field)
+            raise
+
+    @property
+    def heater_id(self):
+        return self._jollymec.heater_id
+
+    @property
+    def client(self):
+        return self._jollymec.client
 
     @property
     def air_temperature(self):
-        # _LOGGER.debug("temp Device : %s", self._device['airTemperature'])
-        return self._device['airTemperature']
+        return self.state.air_temperature
 
     @property
     def gas_temperature(self):
-        return self._device['smokeTemperature']
+        return self.state.smoke_temperature
+
     @property
     def set_power(self):
-        return self._device['lastSetPower']
-    # @property
-    # def set_air_temperature(self):
-    #     return float(self._device['lastSetAirTemperature'])
+        return self.state.set_power
 
     @property
     def current_power(self):
-        return self._device['lastSetPower']
+        return self.state.set_power
  
     @property
     def status(self):
-        #_LOGGER.debug("device status %s", int(self._device['deviceStatus']))
-        return self.STATUS_TRANSLATED[int(self._device['deviceStatus'])] 
+        return self.state.status
  
     @property
     def real_power(self):
-        return self._device['realPower']
+        return self.state.real_power
 
     @property
     def alarms(self):
-        if self._device['deviceStatus'] in self.STATUS_ALARMS and self._device['isDeviceInAlarm'] :
-            _LOGGER.debug("affichage alarm:%s", self.ALARMS[int(self._device['deviceStatus'])] )
-            return self.ALARMS[int(self._device['deviceStatus'])]
+        return self.state.alarm
 
     @property
     def status_translated(self):
-        return self._device['deviceStatus']
+        return self.state.status_code
 
     @property
     def target_temperature(self):
-        return self._device['lastSetAirTemperature']
+        return self.state.target_temperature
         
-    @set_power.setter
-    def set_power(self, value):
-        main(self._jollymec.email, self._jollymec.password)
+    async def async_set_power(self, value):
         _LOGGER.debug("puissance transmise: %s", value)
-        command_jollymec('write-parameters-queue','set-power=' + str(value), self._jollymec.heater_id)
+        value = int(value)
+        await self._async_optimistic(
+            'set_power', value, lambda state: state.set_power == value,
+            self._writer.async_write('set-power', value))
         return 
 
-    #@set_air_temperature.setter
-    def set_air_temperature(self, value):
-        main(self._jollymec.email, self._jollymec.password)
-        command_jollymec('write-parameters-queue','set-air-temperature=' + str(int(value)), self._jollymec.heater_id)
-        _LOGGER.debug("temperature api %s", self._device['lastSetAirTemperature'])
+    async def async_set_air_temperature(self, value):
+        _LOGGER.debug("temperature api %s", self.state.target_temperature)
         _LOGGER.debug("temperature transmise: %s", value)
+        value = int(value)
+        await self._async_optimistic(
+            'target_temperature', float(value), lambda state: state.target_temperature == value,
+            self._writer.async_write('set-air-temperature', value))
         return 
 
-    def update(self):
-        main(self._jollymec.email, self._jollymec.password)
-        update =  command_jollymec('get-state', '1', self._jollymec.heater_id)
-        responseData = json.loads(update['data']) 
-        #_LOGGER.debug("affichage update %s", responseData['airTemperature'])
-        dev= responseData
-        self._device = dev
-        #self._device['deviceStatus'] = 1
-        #_LOGGER.debug("affichage update  %s", self._device['airTemperature'])        
+    async def async_update(self):
+        await self._jollymec.client.async_ensure_session()
+        update = await self._jollymec.client.async_get_state(self._jollymec.heater_id)
+        if update['state'] != "OK":
+            raise ConnectionError(update['state'])
+        digest = update.get('digest')
+        if digest is not None and digest == self._digest:
+            self.apply_state(self._reported)
+            return
+        self.apply_state(DeviceState.from_message(update['data']))
+        self._digest = digest
         
-    def turn_on(self):
+    async def async_turn_on(self):
         _LOGGER.debug("allumage du poele")
-        command_jollymec('heater-on','1', self._jollymec.heater_id)
+        await self._async_optimistic(
+            'status', Status.IGNITION, lambda state: state.status != Status.OFF,
+            self._async_send('heater-on'))
         return True
  
-    def turn_off(self):
+    async def async_turn_off(self):
         _LOGGER.debug("extinction du poele")
-        command_jollymec('heater-off','1', self._jollymec.heater_id)
+        await self._async_optimistic(
+            'status', Status.OFF, lambda state: state.status in (Status.OFF, Status.FINAL_CLEANING),
+            self._async_send('heater-off'))
         return True
+
+    async def _async_send(self, method):
+        await self._jollymec.client.async_ensure_session()
+        result = await self._jollymec.client.async_command(method, '1', self._jollymec.heater_id)
+        if result['state'] != "OK":
+            raise ConnectionError(result['state'])
     
 
 
@@ -274,3 +831,17 @@ class ConnectionError(Error):
 
     def __init__(self, message):
         super().__init__(message)
+
+
+class CircuitOpenError(ConnectionError):
+    """The cloud is failing, requests are short-circuited"""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class DeadlineExceeded(ConnectionError):
+    """The time budget of a cloud call ran out"""
+
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,91 @@
+"""Request metrics of the efesto cloud client."""
+from collections import Counter, deque
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SAMPLES = 200
+
+
+class LatencyHistogram(object):
+    """Fixed-bucket latency histogram that also keeps the most recent samples."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        index = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        """Percentile of the recent samples, None before the first one."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self):
+        labels = ['<={}'.format(bound) for bound in self.buckets] + ['>{}'.format(self.buckets[-1])]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class ClientMetrics(object):
+    """Latencies per cloud method plus retry, login and error counters.
+
+    Only plain counters and a bounded deque are touched per request, so
+    recording is cheap enough to stay always on.
+    """
+
+    def __init__(self):
+        self.latency = {}
+        self.counters = Counter()
+        self.errors = Counter()
+        self.last_success = {}
+        self.last_error = None
+
+    def observe(self, method, seconds):
+        histogram = self.latency.get(method)
+        if histogram is None:
+            histogram = self.latency[method] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def success(self, method):
+        self.last_success[method] = time.time()
+
+    def increment(self, name):
+        self.counters[name] += 1
+
+    def error(self, kind, message=None):
+        self.errors[kind] += 1
+        self.last_error = {'kind': kind, 'message': message, 'time': time.time()}
+
+    def as_dict(self):
+        return {
+            'latency': {method: histogram.as_dict() for method, histogram in self.latency.items()},
+            'counters': dict(self.counters),
+            'errors': dict(self.errors),
+            'last_success': dict(self.last_success),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,42 @@
+"""Rate-limited logging for errors that repeat during cloud outages."""
+import logging
+import time
+
+DEFAULT_INTERVAL = 300.0
+
+
+class RateLimitedLogger(object):
+    """Log a recurring message at most once per ``interval`` seconds per key.
+
+    Suppressed occurrences are counted and reported with the next message
+    that gets through, so an outage shows up as a few lines instead of one
+    per retry. Nothing is formatted when the level is disabled.
+    """
+
+    def __init__(self, logger, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self._logger = logger
+        self.interval = interval
+        self._clock = clock
+        # key -> [time of the last emitted message, suppressed since]
+        self._last = {}
+
+    def log(self, level, key, msg, *args):
+        if not self._logger.isEnabledFor(level):
+            return
+        now = self._clock()
+        last = self._last.get(key)
+        if last is not None and now - last[0] < self.interval:
+            last[1] += 1
+            return
+        suppressed = last[1] if last is not None else 0
+        self._last[key] = [now, 0]
+        if suppressed:
+            msg += " (%s similar messages suppressed)"
+            args += (suppressed,)
+        self._logger.log(level, msg, *args)
+
+    def warning(self, key, msg, *args):
+        self.log(logging.WARNING, key, msg, *args)
+
+    def error(self, key, msg, *args):
+        self.log(logging.ERROR, key, msg, *args)
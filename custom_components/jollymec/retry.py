@@ -0,0 +1,118 @@
+"""Retry and circuit breaker policies for the efesto cloud client."""
+import asyncio
+import random
+import time
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+RETRIES = 5
+# One request failing all its attempts opens the circuit, not part of them
+FAILURE_THRESHOLD = RETRIES + 1
+
+
+class RetryPolicy(object):
+    """Exponential backoff with jitter between attempts of one request.
+
+    The attempt counter belongs to the caller, so every request starts from
+    zero instead of sharing a process-wide counter.
+    """
+
+    def __init__(self, retries=RETRIES, base_delay=2.0, max_delay=30.0, sleep=asyncio.sleep, rand=random.random,
+                 clock=time.monotonic):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._rand = rand
+        self._clock = clock
+
+    def delay(self, attempt):
+        """Return the wait before retry number ``attempt`` (0 based).
+
+        Half of the exponential delay is fixed and half is random, so
+        several heaters failing together don't retry in lockstep.
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay / 2 + self._rand() * delay / 2
+
+    async def async_sleep(self, attempt, deadline=None):
+        """Wait before retry ``attempt``; False without waiting if that would
+        end past ``deadline`` (a clock value)."""
+        delay = self.delay(attempt)
+        if deadline is not None and self._clock() + delay >= deadline:
+            return False
+        await self._sleep(delay)
+        return True
+
+
+class CircuitBreaker(object):
+    """Fail fast while the cloud keeps answering with its error page.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests are refused for ``reset_timeout`` seconds; it should exceed the
+    retries of a request so that one request can use them all. Then a single trial
+    request is let through: success closes the circuit, failure opens it
+    again for twice as long, up to ``max_reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=60.0, max_reset_timeout=900.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._clock = clock
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._open_timeout = reset_timeout
+        self._trial_started = 0.0
+
+    @property
+    def state(self):
+        if self._state == STATE_OPEN and self.retry_after == 0:
+            return STATE_HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self):
+        """Whether requests are currently being short-circuited."""
+        return self._state == STATE_OPEN
+
+    @property
+    def retry_after(self):
+        """Seconds left before a trial request is allowed."""
+        if self._state != STATE_OPEN:
+            return 0
+        return max(0.0, self._opened_at + self._open_timeout - self._clock())
+
+    def allow_request(self):
+        if self._state == STATE_CLOSED:
+            return True
+        if self._state == STATE_OPEN and self.retry_after == 0:
+            self._state = STATE_HALF_OPEN
+            self._trial_started = self._clock()
+            return True
+        if self._state == STATE_HALF_OPEN and self._clock() - self._trial_started > self.reset_timeout:
+            # The trial request never reported back, let another one through
+            self._trial_started = self._clock()
+            return True
+        return False
+
+    def record_success(self):
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._open_timeout = self.reset_timeout
+
+    def record_failure(self):
+        if self._state == STATE_HALF_OPEN:
+            self._open(min(self.max_reset_timeout, self._open_timeout * 2))
+            return
+        self._failures += 1
+        if self._state == STATE_CLOSED and self._failures >= self.failure_threshold:
+            self._open(self.reset_timeout)
+
+    def _open(self, timeout):
+        self._state = STATE_OPEN
+        self._opened_at = self._clock()
+        self._open_timeout = timeout
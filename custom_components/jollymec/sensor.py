@@ -0,0 +1,267 @@
+"""Sensors for Jollymec heating devices, fed by the climate coordinator."""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import CONF_ID, CONF_NAME, EntityCategory, UnitOfMass, UnitOfTemperature, UnitOfTime
+
+from .const import DATA_COORDINATORS, DOMAIN
+from .consumption import ConsumptionMeter
+from .entity import JollyMecEntity
+from .hajolly import Device
+
+
+@dataclass(frozen=True, kw_only=True)
+class JollyMecSensorEntityDescription(SensorEntityDescription):
+    """Describes a Jollymec sensor."""
+
+    value_fn: Callable[[Device], Any]
+    deadband: str | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class JollyMecTrendSensorEntityDescription(SensorEntityDescription):
+    """Describes the rolling statistics of a telemetry channel."""
+
+    channel: str
+
+
+@dataclass(frozen=True, kw_only=True)
+class JollyMecConsumptionSensorEntityDescription(SensorEntityDescription):
+    """Describes a running total of the consumption meter."""
+
+    value_fn: Callable[[ConsumptionMeter], float]
+
+
+def _latency_ms(device, method, fraction):
+    histogram = device.client.metrics.latency.get(method)
+    if histogram is None or (value := histogram.percentile(fraction)) is None:
+        return None
+    return round(value * 1000)
+
+
+def _last_success(device, method):
+    timestamp = device.client.metrics.last_success.get(method)
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+SENSORS = (
+    JollyMecSensorEntityDescription(
+        key="smoke_temperature",
+        name="Smoke temperature",
+        device_class=SensorDeviceClass.TEMPERATURE,
+        native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.gas_temperature,
+        deadband="smoke_temperature",
+    ),
+    JollyMecSensorEntityDescription(
+        key="real_power",
+        name="Real power",
+        icon="mdi:fire",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.real_power,
+    ),
+    JollyMecSensorEntityDescription(
+        key="status",
+        name="Status",
+        icon="mdi:information-outline",
+        value_fn=lambda device: device.status,
+    ),
+    JollyMecSensorEntityDescription(
+        key="alarm",
+        name="Alarm",
+        icon="mdi:alert",
+        value_fn=lambda device: device.alarms,
+    ),
+)
+
+# Slope over the telemetry buffer, min/max/mean as attributes
+TREND_SENSORS = (
+    JollyMecTrendSensorEntityDescription(
+        key="air_temperature_trend",
+        name="Air temperature trend",
+        icon="mdi:thermometer-lines",
+        native_unit_of_measurement="°C/h",
+        state_class=SensorStateClass.MEASUREMENT,
+        channel="air_temperature",
+    ),
+    JollyMecTrendSensorEntityDescription(
+        key="smoke_temperature_trend",
+        name="Smoke temperature trend",
+        icon="mdi:thermometer-lines",
+        native_unit_of_measurement="°C/h",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_registry_enabled_default=False,
+        channel="smoke_temperature",
+    ),
+    JollyMecTrendSensorEntityDescription(
+        key="real_power_trend",
+        name="Real power trend",
+        icon="mdi:chart-line",
+        native_unit_of_measurement="/h",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_registry_enabled_default=False,
+        channel="real_power",
+    ),
+)
+
+CONSUMPTION_SENSORS = (
+    JollyMecConsumptionSensorEntityDescription(
+        key="pellet_consumption",
+        name="Pellet consumption",
+        icon="mdi:grain",
+        device_class=SensorDeviceClass.WEIGHT,
+        native_unit_of_measurement=UnitOfMass.KILOGRAMS,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=2,
+        value_fn=lambda meter: meter.pellets,
+    ),
+    JollyMecConsumptionSensorEntityDescription(
+        key="burn_time",
+        name="Burn time",
+        icon="mdi:timer-outline",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.HOURS,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=2,
+        value_fn=lambda meter: meter.burn_hours,
+    ),
+)
+
+# Metrics of the cloud client, disabled by default
+DIAGNOSTIC_SENSORS = (
+    JollyMecSensorEntityDescription(
+        key="cloud_latency",
+        name="Cloud latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda device: _latency_ms(device, 'get-state', 0.9),
+    ),
+    JollyMecSensorEntityDescription(
+        key="cloud_retries",
+        name="Cloud retries",
+        icon="mdi:reload",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda device: device.client.metrics.counters['retries'],
+    ),
+    JollyMecSensorEntityDescription(
+        key="cloud_logins",
+        name="Cloud logins",
+        icon="mdi:login",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda device: device.client.metrics.counters['logins'],
+    ),
+    JollyMecSensorEntityDescription(
+        key="cloud_errors",
+        name="Cloud errors",
+        icon="mdi:cloud-alert",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda device: sum(device.client.metrics.errors.values()),
+    ),
+    JollyMecSensorEntityDescription(
+        key="last_successful_poll",
+        name="Last successful poll",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value_fn=lambda device: _last_success(device, 'get-state'),
+    ),
+)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the sensors of a heater discovered by the climate platform."""
+    if discovery_info is None:
+        return
+
+    coordinator = hass.data[DOMAIN][DATA_COORDINATORS][discovery_info[CONF_ID]]
+    async_add_entities(_create_sensors(coordinator, discovery_info[CONF_NAME]))
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the sensors of the heater of a config entry."""
+    coordinator = hass.data[DOMAIN][DATA_COORDINATORS][entry.data[CONF_ID]]
+    async_add_entities(_create_sensors(coordinator, entry.data[CONF_NAME]))
+
+
+def _create_sensors(coordinator, name):
+    return (
+        [JollyMecSensor(coordinator, name, description) for description in SENSORS + DIAGNOSTIC_SENSORS]
+        + [JollyMecTrendSensor(coordinator, name, description) for description in TREND_SENSORS]
+        + [JollyMecConsumptionSensor(coordinator, name, description) for description in CONSUMPTION_SENSORS]
+    )
+
+
+class JollyMecSensor(JollyMecEntity, SensorEntity):
+    """Representation of one value of a Jollymec get-state reply."""
+
+    entity_description: JollyMecSensorEntityDescription
+
+    def __init__(self, coordinator, name, description):
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._attr_name = f"{name} {description.name}"
+        self._attr_unique_id = f"{coordinator.device.heater_id}_{description.key}"
+        if getattr(description, "deadband", None):
+            self._deadbands = {"state": description.deadband}
+
+    @property
+    def native_value(self):
+        """Return the value reported by the last get-state."""
+        return self.entity_description.value_fn(self.coordinator.device)
+
+
+class JollyMecTrendSensor(JollyMecSensor):
+    """Rolling statistics of one channel of the heater telemetry."""
+
+    entity_description: JollyMecTrendSensorEntityDescription
+    _deadbands = {'state': 'trend'}
+    _volatile = frozenset({'samples', 'window_minutes'})
+
+    @property
+    def native_value(self):
+        """Return the slope per hour over the buffered samples."""
+        slope = self.coordinator.telemetry.channel(self.entity_description.channel).slope
+        return None if slope is None else round(slope, 2)
+
+    @property
+    def extra_state_attributes(self):
+        telemetry = self.coordinator.telemetry
+        stats = telemetry.channel(self.entity_description.channel)
+        return {
+            'min': stats.min,
+            'max': stats.max,
+            'mean': None if stats.mean is None else round(stats.mean, 2),
+            'samples': stats.count,
+            'window_minutes': round(telemetry.span / 60),
+        }
+
+
+class JollyMecConsumptionSensor(JollyMecSensor):
+    """Running total of pellets burnt or burn time of a heater."""
+
+    entity_description: JollyMecConsumptionSensorEntityDescription
+    _deadbands = {'state': 'consumption'}
+
+    @property
+    def native_value(self):
+        """Return the total integrated over the polls so far."""
+        return round(self.entity_description.value_fn(self.coordinator.consumption), 4)
@@ -0,0 +1,35 @@
+"""Last known state of a heater, kept across restarts."""
+from .hajolly import DeviceState
+
+
+class DeviceSnapshot(object):
+    """Last state the cloud reported for one heater and when.
+
+    Restored at startup so entities have values before the first poll.
+    ``on_sample`` is called when the reported state changes, e.g. to
+    schedule a save; identical polls only move ``timestamp``.
+    """
+
+    def __init__(self, state=None, timestamp=None):
+        self.state = state
+        self.timestamp = timestamp
+        self.on_sample = None
+
+    def update(self, timestamp, state):
+        changed = state != self.state
+        self.state = state
+        self.timestamp = timestamp
+        if changed and self.on_sample is not None:
+            self.on_sample()
+
+    def as_dict(self):
+        return {
+            'state': self.state.as_dict() if self.state is not None else None,
+            'timestamp': self.timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data or not data.get('state'):
+            return cls()
+        return cls(DeviceState.from_dict(data['state']), data.get('timestamp'))
@@ -0,0 +1,94 @@
+"""Persistence of the Jollymec cloud sessions."""
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY_SESSIONS = f"{DOMAIN}.sessions"
+STORAGE_KEY_TELEMETRY = f"{DOMAIN}.telemetry"
+STORAGE_KEY_CONSUMPTION = f"{DOMAIN}.consumption"
+STORAGE_KEY_SNAPSHOTS = f"{DOMAIN}.snapshots"
+SAVE_DELAY = 10
+# Samples arrive every poll; Home Assistant also writes pending saves on stop
+TELEMETRY_SAVE_DELAY = 300
+CONSUMPTION_SAVE_DELAY = 60
+SNAPSHOT_SAVE_DELAY = 300
+
+
+class JollyMecSessionStore:
+    """Keep the session cookies of every account, saved only when they change.
+
+    The store is read once at startup; afterwards the cookies live in memory
+    and writes go through Home Assistant storage, which is asynchronous and
+    atomic.
+    """
+
+    def __init__(self, hass):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY_SESSIONS, private=True, atomic_writes=True)
+        self._sessions = {}
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data:
+            self._sessions = data
+
+    def async_get(self, username):
+        return self._sessions.get(username.lower())
+
+    def async_save(self, username, cookies):
+        key = username.lower()
+        if self._sessions.get(key) == cookies:
+            return
+        self._sessions[key] = cookies
+        _LOGGER.debug("Session cookies changed, scheduling save")
+        self._store.async_delay_save(lambda: self._sessions, SAVE_DELAY)
+
+
+class JollyMecHeaterStore:
+    """Keep per-heater objects (telemetry, consumption, snapshots) across restarts.
+
+    ``async_get`` builds the object of a heater from its saved data with
+    ``factory`` and hooks its ``on_sample``, so every new sample schedules
+    a delayed save of all objects and at most one write happens per delay.
+    """
+
+    def __init__(self, hass, key, save_delay):
+        self._store = Store(hass, STORAGE_VERSION, key, atomic_writes=True)
+        self._save_delay = save_delay
+        self._saved = {}
+        self._objects = {}
+        self._save_scheduled = False
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data:
+            self._saved = data
+
+    def async_get(self, heater_id, factory):
+        # A reloaded heater carries on from its object of the previous setup
+        previous = self._objects.get(heater_id)
+        data = previous.as_dict() if previous is not None else self._saved.pop(heater_id, None)
+        obj = factory(data)
+        obj.on_sample = self._async_schedule_save
+        self._objects[heater_id] = obj
+        return obj
+
+    def _async_schedule_save(self):
+        # async_delay_save pushes a pending write back on every call: with
+        # samples coming faster than the delay nothing would be written
+        # before shutdown
+        if self._save_scheduled:
+            return
+        self._save_scheduled = True
+        self._store.async_delay_save(self._data_to_save, self._save_delay)
+
+    def _data_to_save(self):
+        self._save_scheduled = False
+        # Heaters not set up this time are kept as they were
+        data = dict(self._saved)
+        data.update((heater_id, obj.as_dict()) for heater_id, obj in self._objects.items())
+        return data
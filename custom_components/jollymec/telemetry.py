@@ -0,0 +1,190 @@
+"""Rolling telemetry of a heater, kept in fixed-size arrays.
+
+Every poll appends one timestamped sample. Min, max, mean and the least
+squares slope of each channel over the samples still in the buffer are
+maintained as samples come in and fall out, so reading them costs nothing.
+"""
+from array import array
+from collections import deque
+import math
+
+TELEMETRY_SAMPLES = 240
+CHANNELS = ('air_temperature', 'smoke_temperature', 'real_power')
+
+
+class RollingChannel(object):
+    """Incremental statistics of one channel; NaN samples are ignored."""
+
+    def __init__(self):
+        self.count = 0
+        self._sum_t = 0.0
+        self._sum_y = 0.0
+        self._sum_tt = 0.0
+        self._sum_ty = 0.0
+        # Monotonic queues of (sequence, value), oldest first
+        self._min = deque()
+        self._max = deque()
+
+    def add(self, seq, t, y):
+        if math.isnan(y):
+            return
+        self.count += 1
+        self._sum_t += t
+        self._sum_y += y
+        self._sum_tt += t * t
+        self._sum_ty += t * y
+        while self._min and self._min[-1][1] >= y:
+            self._min.pop()
+        self._min.append((seq, y))
+        while self._max and self._max[-1][1] <= y:
+            self._max.pop()
+        self._max.append((seq, y))
+
+    def remove(self, seq, t, y):
+        if math.isnan(y):
+            return
+        self.count -= 1
+        self._sum_t -= t
+        self._sum_y -= y
+        self._sum_tt -= t * t
+        self._sum_ty -= t * y
+        if self._min and self._min[0][0] <= seq:
+            self._min.popleft()
+        if self._max and self._max[0][0] <= seq:
+            self._max.popleft()
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    @property
+    def mean(self):
+        return self._sum_y / self.count if self.count else None
+
+    @property
+    def slope(self):
+        """Least squares slope in units per hour, None below two samples."""
+        if self.count < 2:
+            return None
+        variance = self.count * self._sum_tt - self._sum_t * self._sum_t
+        if variance <= 0:
+            return None
+        return (self.count * self._sum_ty - self._sum_t * self._sum_y) / variance * 3600
+
+    def as_dict(self):
+        return {
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'slope': self.slope,
+            'samples': self.count,
+        }
+
+
+class TelemetryBuffer(object):
+    """Ring buffer of the last ``capacity`` polls of one heater.
+
+    Timestamps are stored relative to the first sample so the running sums
+    keep their precision; the sums are rebuilt from the arrays once per
+    lap of the ring to stop rounding errors from accumulating.
+    ``on_sample`` is called after every append, e.g. to schedule a save.
+    """
+
+    def __init__(self, capacity=TELEMETRY_SAMPLES):
+        self.capacity = capacity
+        self.on_sample = None
+        self._origin = None
+        self._times = array('d', [0.0] * capacity)
+        self._values = {name: array('d', [math.nan] * capacity) for name in CHANNELS}
+        self._size = 0
+        self._head = 0
+        self._seq = 0
+        self._channels = {name: RollingChannel() for name in CHANNELS}
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, **values):
+        """Record the channel ``values`` (None when unknown) polled at ``timestamp``."""
+        if self._origin is None:
+            self._origin = timestamp
+        t = timestamp - self._origin
+        head = self._head
+        oldest_seq = self._seq - self.capacity
+        if self._size == self.capacity:
+            old_t = self._times[head]
+            for name, channel in self._channels.items():
+                channel.remove(oldest_seq, old_t, self._values[name][head])
+        else:
+            self._size += 1
+        self._times[head] = t
+        for name, channel in self._channels.items():
+            value = values.get(name)
+            value = math.nan if value is None else float(value)
+            self._values[name][head] = value
+            channel.add(self._seq, t, value)
+        self._seq += 1
+        self._head = (head + 1) % self.capacity
+        if self._head == 0:
+            self._rebuild()
+        if self.on_sample is not None:
+            self.on_sample()
+
+    def channel(self, name):
+        return self._channels[name]
+
+    @property
+    def span(self):
+        """Seconds between the oldest and the newest sample."""
+        if self._size < 2:
+            return 0.0
+        newest = self._times[(self._head - 1) % self.capacity]
+        oldest = self._times[self._head if self._size == self.capacity else 0]
+        return newest - oldest
+
+    def _ordered(self):
+        start = self._head if self._size == self.capacity else 0
+        for offset in range(self._size):
+            yield (start + offset) % self.capacity
+
+    def _rebuild(self):
+        channels = {name: RollingChannel() for name in CHANNELS}
+        seq = self._seq - self._size
+        for index in self._ordered():
+            for name, channel in channels.items():
+                channel.add(seq, self._times[index], self._values[name][index])
+            seq += 1
+        self._channels = channels
+
+    def as_dict(self):
+        """Serializable samples, oldest first, for persistence."""
+        indexes = list(self._ordered())
+        return {
+            'origin': self._origin,
+            'times': [self._times[index] for index in indexes],
+            'values': {
+                name: [None if math.isnan(values[index]) else values[index] for index in indexes]
+                for name, values in self._values.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data, capacity=TELEMETRY_SAMPLES):
+        buffer = cls(capacity)
+        if not data or data.get('origin') is None:
+            return buffer
+        origin = data['origin']
+        times = data['times'][-capacity:]
+        values = {name: data['values'].get(name, [])[-capacity:] for name in CHANNELS}
+        for index, t in enumerate(times):
+            buffer.append(origin + t, **{
+                name: column[index] if index < len(column) else None for name, column in values.items()
+            })
+        return buffer
+
+    def stats(self):
+        return {name: channel.as_dict() for name, channel in self._channels.items()}
@@ -0,0 +1,172 @@
+"""Transports carrying the HTTP exchanges of the cloud client.
+
+HttpTransport talks to the network. RecordingTransport wraps another
+transport and appends every exchange, credentials and login pages redacted,
+to a JSON lines file (gzip compressed when the name ends in .gz).
+ReplayTransport serves
+such a file back without any network access, so real get-state payloads and
+error pages can be used offline.
+"""
+import asyncio
+from base64 import b64decode, b64encode
+from collections import Counter, deque, namedtuple
+import gzip
+import json
+import threading
+import time
+
+import aiohttp
+from yarl import URL
+
+# Seconds to open a connection and between two reads of a reply
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 20.0
+
+REDACTED = "**REDACTED**"
+SENSITIVE_FIELDS = ('login[username]', 'login[password]')
+REPLAYED_COOKIE = "replayed"
+
+TransportResponse = namedtuple('TransportResponse', 'status content_type cookies')
+
+
+def redact_form(data):
+    return {key: REDACTED if key in SENSITIVE_FIELDS else value for key, value in data.items()}
+
+
+def is_login(data):
+    """Whether the form carries credentials; the page answering it may show the account."""
+    return any(key in SENSITIVE_FIELDS for key in data)
+
+
+def exchange_key(url, data):
+    """What identifies an exchange: path and ajax fields, never credentials."""
+    return (URL(url).path, data.get('method'), data.get('device'), data.get('params'))
+
+
+def _open(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class HttpTransport(object):
+    """Posts with the client's aiohttp session.
+
+    A stalled connection fails after ``connect_timeout`` or ``read_timeout``
+    seconds instead of holding the poll forever.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+
+    async def async_post(self, session, url, data, headers):
+        async with session.post(url, data=data, headers=headers, timeout=self.timeout) as response:
+            body = await response.read()
+        return TransportResponse(response.status, response.content_type, list(response.cookies)), body
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(object):
+    """Records every exchange of ``inner`` to ``path``.
+
+    The file is opened on the first exchange and kept open, so a .gz
+    recording is one compressed stream per run; ``close`` (blocking) flushes
+    it.
+    """
+
+    def __init__(self, inner, path):
+        self._inner = inner
+        self._path = path
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file = None
+
+    async def async_post(self, session, url, data, headers):
+        start = time.monotonic()
+        response, body = await self._inner.async_post(session, url, data, headers)
+        record = {
+            't': round(start - self._start, 3),
+            'elapsed': round(time.monotonic() - start, 3),
+            'path': URL(url).path,
+            'form': redact_form(data),
+            'status': response.status,
+            'content_type': response.content_type,
+            'cookies': response.cookies,
+        }
+        if is_login(data):
+            record['body'] = REDACTED
+        else:
+            try:
+                record['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                record['body_b64'] = b64encode(body).decode('ascii')
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        await asyncio.get_running_loop().run_in_executor(None, self._append, line)
+        return response, body
+
+    def _append(self, line):
+        with self._lock:
+            if self._file is None:
+                self._file = _open(self._path, 'a')
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayTransport(object):
+    """Serves recorded exchanges back, matched on path and ajax fields.
+
+    Exchanges with the same key are served in recorded order and the last
+    one is repeated once the others are used up. ``realtime`` replays the
+    recorded latencies. Call ``load`` (blocking) before use.
+    """
+
+    def __init__(self, path, realtime=False):
+        self._path = path
+        self.realtime = realtime
+        self.requests = Counter()
+        self._exchanges = {}
+
+    @property
+    def heaters(self):
+        return sorted({key[2] for key in self._exchanges if key[2]})
+
+    def load(self):
+        exchanges = {}
+        with _open(self._path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'body_b64' in record:
+                    record['body'] = b64decode(record.pop('body_b64'))
+                else:
+                    record['body'] = record['body'].encode('utf-8')
+                key = (record['path'], record['form'].get('method'),
+                       record['form'].get('device'), record['form'].get('params'))
+                exchanges.setdefault(key, deque()).append(record)
+        self._exchanges = exchanges
+        return self
+
+    def close(self):
+        pass
+
+    async def async_post(self, session, url, data, headers):
+        key = exchange_key(url, data)
+        self.requests[key[1] or key[0]] += 1
+        queue = self._exchanges.get(key)
+        if not queue:
+            raise aiohttp.ClientConnectionError("No recorded exchange for {}".format(key))
+        record = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.realtime and record['elapsed']:
+            await asyncio.sleep(record['elapsed'])
+        if record['cookies']:
+            session.cookie_jar.update_cookies(
+                {name: REPLAYED_COOKIE for name in record['cookies']}, URL(url))
+        return TransportResponse(record['status'], record['content_type'], record['cookies']), record['body']
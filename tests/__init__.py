@@ -0,0 +1 @@
+"""Unit tests of the Jollymec integration, run from the repository root with pytest."""
@@ -0,0 +1,99 @@
+"""Fake clocks and a fake cloud shared by the tests."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from custom_components.jollymec import hajolly
+from custom_components.jollymec.retry import CircuitBreaker, RetryPolicy
+from custom_components.jollymec.transport import TransportResponse
+
+
+class FakeClock(object):
+    """Monotonic clock that only moves when told to, or by awaiting ``sleep``."""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def run_virtual(coro, start=0.0, clock=None):
+    """Run ``coro`` on an event loop whose time jumps straight to the next timer.
+
+    Timers (call_later, asyncio.sleep) fire in order without any real wait;
+    returns the result and the loop time when ``coro`` finished. The loop
+    runs on ``clock`` when given, so a client can share it.
+    """
+    loop = asyncio.new_event_loop()
+    clock = clock or FakeClock(start)
+    select = loop._selector.select
+
+    def virtual_select(timeout=None):
+        if timeout:
+            clock.advance(timeout)
+        return select(0)
+
+    loop.time = clock
+    loop._selector.select = virtual_select
+    try:
+        return loop.run_until_complete(coro), clock.now
+    finally:
+        loop.close()
+
+
+class FakeCloud(object):
+    """Transport answering logins and ajax commands like the efesto cloud.
+
+    ``states`` maps heater ids to their get-state message. Commands fail
+    with "not logged in" until a login, and again after ``expire_session``.
+    Every request waits ``latency`` seconds and is recorded in ``requests``
+    by method, 'login' for logins. Logins are refused while
+    ``login_status`` is not 200.
+    """
+
+    def __init__(self, states=None, latency=0.0):
+        self.states = dict(states or {})
+        self.latency = latency
+        self.login_status = 200
+        self.requests = []
+        self.logins = 0
+        self._logged_in = False
+
+    def expire_session(self):
+        self._logged_in = False
+
+    async def async_post(self, session, url, data, headers):
+        method = data.get('method', 'login')
+        self.requests.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'login':
+            if self.login_status != 200:
+                return TransportResponse(self.login_status, 'text/html', []), b'<html></html>'
+            self.logins += 1
+            self._logged_in = True
+            session.cookie_jar[:] = [SimpleNamespace(key='PHPSESSID', value=str(self.logins))]
+            return TransportResponse(200, 'text/html', ['PHPSESSID']), b'<html></html>'
+        if not self._logged_in:
+            reply = {'status': 1}
+        else:
+            reply = {'status': 0, 'message': self.states.get(data['device'], {})}
+        return TransportResponse(200, 'application/json', []), json.dumps(reply).encode('utf-8')
+
+
+def cloud_client(cloud, clock, **kwargs):
+    """JollyMecClient of the account on ``cloud``, retrying and timing out on ``clock``."""
+    session = SimpleNamespace(closed=False, cookie_jar=[])
+    return hajolly.JollyMecClient(
+        session, 'user', 'password', transport=cloud, clock=clock,
+        retry_policy=RetryPolicy(sleep=clock.sleep, rand=lambda: 0.0, clock=clock),
+        breaker=CircuitBreaker(clock=clock), **kwargs)
@@ -0,0 +1,102 @@
+"""Presets of the climate entity, locally controlled and through the cloud."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.jollymec.climate import JollyMecDevice
+from custom_components.jollymec import hajolly
+from homeassistant.components.climate.const import PRESET_AWAY, PRESET_ECO, PRESET_NONE
+
+
+class FakeDevice(object):
+    """Records the commands sent to the stove."""
+
+    def __init__(self):
+        self.current_power = 3
+        self.status = None
+        self.pending = []
+        self.target_temperature = None
+        self.commands = []
+
+    async def async_set_power(self, value):
+        self.commands.append(('set_power', value))
+
+    async def async_set_air_temperature(self, value):
+        self.commands.append(('set_air_temperature', value))
+
+
+def make_entity(presets, fans, target_sensor=None, target_temp=20.0):
+    coordinator = SimpleNamespace(
+        device=FakeDevice(), data=None, stale=False, deadbands={}, last_update_success=True,
+        async_command_sent=lambda: None)
+    entity = JollyMecDevice(
+        'Stove', 'H1', 'H1', coordinator, None, None, target_temp, None, None, None,
+        presets, fans, target_sensor)
+    entity.writes = 0
+
+    def write():
+        entity.writes += 1
+
+    entity.async_write_ha_state = write
+    return entity
+
+
+@pytest.fixture
+def local():
+    return make_entity({PRESET_ECO: 18.0}, {PRESET_ECO: 2}, target_sensor='sensor.room')
+
+
+def test_local_preset_without_temperature_keeps_the_target(local):
+    asyncio.run(local.async_set_preset_mode(PRESET_AWAY))
+    assert local.preset_mode == PRESET_AWAY
+    assert local.target_temperature == 20.0
+    assert local._device.commands == []
+    assert local.writes == 1
+
+
+def test_local_preset_sets_its_temperature_and_power(local):
+    asyncio.run(local.async_set_preset_mode(PRESET_ECO))
+    assert local.target_temperature == 18.0
+    # The setpoint stays local, only the power reaches the stove
+    assert local._device.commands == [('set_power', 2)]
+    asyncio.run(local.async_set_preset_mode(PRESET_NONE))
+    assert local.target_temperature == 20.0
+
+
+def test_local_preset_temperature_changed_by_the_user_wins(local):
+    asyncio.run(local.async_set_preset_mode(PRESET_ECO))
+    asyncio.run(local.async_set_temperature(temperature=17.5))
+    asyncio.run(local.async_set_preset_mode(PRESET_NONE))
+    asyncio.run(local.async_set_preset_mode(PRESET_ECO))
+    assert local.target_temperature == 17.5
+
+
+def test_unknown_preset_is_ignored(local):
+    asyncio.run(local.async_set_preset_mode('party'))
+    assert local.preset_mode == PRESET_NONE
+    assert local.writes == 0
+
+
+def test_cloud_preset_sends_its_configured_values():
+    entity = make_entity({PRESET_ECO: 18.0}, {PRESET_ECO: 2})
+    asyncio.run(entity.async_set_preset_mode(PRESET_ECO))
+    assert sorted(entity._device.commands) == [('set_air_temperature', 18.0), ('set_power', 2)]
+    asyncio.run(entity.async_set_preset_mode(PRESET_AWAY))
+    assert entity.preset_mode == PRESET_AWAY
+    assert len(entity._device.commands) == 2
+
+
+def test_failed_cloud_preset_write_is_logged_and_written(caplog):
+    entity = make_entity({PRESET_ECO: 18.0}, {PRESET_ECO: 2})
+
+    async def fail(value):
+        raise hajolly.ConnectionError("Communications error, giving up after 5 retries")
+
+    entity._device.async_set_air_temperature = fail
+    asyncio.run(entity.async_set_preset_mode(PRESET_ECO))
+    assert "Failed to set temperature" in caplog.text
+    assert entity.preset_mode == PRESET_ECO
+    # The power still went out and the entity shows the preset
+    assert entity._device.commands == [('set_power', 2)]
+    assert entity.writes == 1
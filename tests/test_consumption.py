@@ -0,0 +1,129 @@
+"""ConsumptionMeter against a recomputation over the whole history, and its restore."""
+import json
+import random
+
+import pytest
+
+from custom_components.jollymec.consumption import MAX_GAP, PELLET_RATES, ConsumptionMeter
+from custom_components.jollymec.hajolly import Status
+
+BURNING = (Status.IGNITION, Status.ON)
+
+
+def reference(samples, rates=PELLET_RATES):
+    """(pellets, burn hours) of ``samples`` (timestamp, status, power), from scratch."""
+    pellets = hours = 0.0
+    for (start, status, power), (end, _, _) in zip(samples, samples[1:]):
+        elapsed = end - start
+        if status in BURNING and 0 < elapsed <= MAX_GAP:
+            hours += elapsed / 3600
+            pellets += rates.get(power, 0.0) * elapsed / 3600
+    return pellets, hours
+
+
+def feed(meter, samples):
+    for sample in samples:
+        meter.add(*sample)
+
+
+def test_interval_is_credited_with_the_state_at_its_start():
+    meter = ConsumptionMeter()
+    feed(meter, [(0, Status.ON, 3), (1800, Status.OFF, 3), (3600, Status.ON, 5)])
+    # Half an hour at 1.2 kg/h, then nothing while off
+    assert meter.pellets == pytest.approx(0.6)
+    assert meter.burn_hours == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize('status, burning', [
+    (Status.IGNITION, True), (Status.ON, True), (Status.OFF, False),
+    (Status.STANDBY, False), (Status.FINAL_CLEANING, False), (Status.ALARM, False), (None, False),
+])
+def test_only_ignition_and_on_burn(status, burning):
+    meter = ConsumptionMeter()
+    feed(meter, [(0, status, 2), (1800, Status.OFF, 2)])
+    assert meter.burn_hours == (0.5 if burning else 0.0)
+
+
+@pytest.mark.parametrize('elapsed', [0, -60, MAX_GAP + 1])
+def test_gaps_and_clock_jumps_are_not_integrated(elapsed):
+    meter = ConsumptionMeter()
+    feed(meter, [(10000, Status.ON, 3), (10000 + elapsed, Status.ON, 3)])
+    assert (meter.pellets, meter.burn_hours) == (0.0, 0.0)
+
+
+def test_unknown_power_burns_time_but_no_pellets():
+    meter = ConsumptionMeter(rates={1: 1.0})
+    feed(meter, [(0, Status.ON, None), (900, Status.ON, 7), (1800, Status.ON, 1)])
+    assert meter.burn_hours == pytest.approx(0.5)
+    assert meter.pellets == 0.0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_running_totals_match_a_recomputation(seed):
+    rng = random.Random(seed)
+    statuses = list(Status) + [None]
+    samples = []
+    timestamp = 0.0
+    for _ in range(2000):
+        timestamp += rng.choice([15, 60, 300, rng.uniform(0, 2 * MAX_GAP)])
+        samples.append((timestamp, rng.choice(statuses), rng.choice([None, 1, 2, 3, 4, 5, 6])))
+    meter = ConsumptionMeter()
+    previous = (0.0, 0.0)
+    for sample in samples:
+        meter.add(*sample)
+        # Totals of an energy-style sensor never go down
+        assert meter.pellets >= previous[0] and meter.burn_hours >= previous[1]
+        previous = (meter.pellets, meter.burn_hours)
+    pellets, hours = reference(samples)
+    assert meter.pellets == pytest.approx(pellets)
+    assert meter.burn_hours == pytest.approx(hours)
+
+
+def test_restored_meter_continues_from_the_stored_sample():
+    meter = ConsumptionMeter()
+    feed(meter, [(0, Status.ON, 3), (1800, Status.ON, 4)])
+    # Stored as JSON: the last sample comes back as a list
+    restored = ConsumptionMeter.from_dict(json.loads(json.dumps(meter.as_dict())))
+    assert (restored.pellets, restored.burn_hours) == (meter.pellets, meter.burn_hours)
+
+    # A quick restart: the interval across it is credited to the stored sample
+    restored.add(2700, Status.ON, 4)
+    assert restored.pellets == pytest.approx(0.6 + 1.5 / 4)
+    assert restored.burn_hours == pytest.approx(0.75)
+
+
+def test_long_restart_only_moves_the_reference():
+    meter = ConsumptionMeter()
+    feed(meter, [(0, Status.ON, 3), (1800, Status.ON, 3)])
+    restored = ConsumptionMeter.from_dict(meter.as_dict())
+    restored.add(1800 + MAX_GAP + 1, Status.ON, 3)
+    assert restored.pellets == pytest.approx(0.6)
+    restored.add(1800 + MAX_GAP + 1 + 1800, Status.OFF, 3)
+    assert restored.pellets == pytest.approx(1.2)
+
+
+@pytest.mark.parametrize('data', [None, {}])
+def test_nothing_stored_starts_from_zero(data):
+    meter = ConsumptionMeter.from_dict(data, rates={3: 2.0})
+    assert (meter.pellets, meter.burn_hours) == (0.0, 0.0)
+    feed(meter, [(0, Status.ON, 3), (1800, Status.ON, 3)])
+    # The first sample after a fresh start has nothing before it
+    assert meter.pellets == pytest.approx(1.0)
+
+
+def test_restore_takes_the_configured_rates():
+    stored = ConsumptionMeter()
+    feed(stored, [(0, Status.ON, 3)])
+    meter = ConsumptionMeter.from_dict(stored.as_dict(), rates={3: 2.0})
+    meter.add(1800, Status.ON, 3)
+    assert meter.pellets == pytest.approx(1.0)
+
+
+def test_on_sample_called_per_sample_but_not_on_restore():
+    calls = []
+    meter = ConsumptionMeter()
+    meter.on_sample = lambda: calls.append(1)
+    feed(meter, [(0, Status.OFF, 1), (60, Status.OFF, 1)])
+    assert len(calls) == 2
+    restored = ConsumptionMeter.from_dict(meter.as_dict())
+    assert restored.on_sample is None
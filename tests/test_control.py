@@ -0,0 +1,62 @@
+"""HysteresisController decisions and minimum cycle, on a fake clock."""
+import pytest
+
+from custom_components.jollymec.control import HysteresisController
+
+from .common import FakeClock
+
+
+@pytest.fixture
+def controller():
+    return HysteresisController(cold_tolerance=0.5, hot_tolerance=0.3, min_cycle=600, clock=FakeClock())
+
+
+@pytest.mark.parametrize('current, active, expected', [
+    # Off: switched on only once the room is cold_tolerance below the target
+    (19.6, False, None),
+    (19.5, False, True),
+    (18.0, False, True),
+    (20.5, False, None),
+    # On: switched off only once the room is hot_tolerance above the target
+    (20.2, True, None),
+    (20.3, True, False),
+    (22.0, True, False),
+    (18.0, True, None),
+])
+def test_decision_holds_inside_the_band(controller, current, active, expected):
+    assert controller.wanted(current, 20.0, active) is expected
+
+
+@pytest.mark.parametrize('current, target', [(None, 20.0), (19.0, None)])
+def test_unknown_values_change_nothing(controller, current, target):
+    assert controller.wanted(current, target, False) is None
+    assert controller.wanted(current, target, True) is None
+
+
+def test_sensor_noise_around_the_target_never_switches(controller):
+    active = False
+    switches = 0
+    for current in (19.6, 19.9, 20.1, 19.7, 20.2, 19.8):
+        wanted = controller.wanted(current, 20.0, active)
+        if wanted is not None:
+            active = wanted
+            switches += 1
+    assert switches == 0
+
+
+def test_minimum_cycle_between_switches():
+    clock = FakeClock()
+    controller = HysteresisController(min_cycle=600, clock=clock)
+    assert controller.blocked_for() == 0.0
+    controller.switched()
+    assert controller.blocked_for() == 600
+    clock.advance(450)
+    assert controller.blocked_for() == 150
+    clock.advance(200)
+    assert controller.blocked_for() == 0.0
+
+
+def test_no_minimum_cycle_never_blocks():
+    controller = HysteresisController(clock=FakeClock())
+    controller.switched()
+    assert controller.blocked_for() == 0.0
@@ -0,0 +1,72 @@
+"""Account clients shared by the coordinators of their heaters."""
+import asyncio
+from types import SimpleNamespace
+
+from custom_components.jollymec.const import DATA_CLIENTS, DATA_COORDINATORS, DOMAIN
+from custom_components.jollymec.coordinator import async_close_clients, async_remove_coordinator
+
+
+class FakeSession(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def detach(self):
+        self.closed = True
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCoordinator(object):
+
+    def __init__(self, client):
+        self.device = SimpleNamespace(client=client)
+        self.shut_down = False
+
+    async def async_shutdown(self):
+        self.shut_down = True
+
+
+def setup(heaters):
+    """hass with the coordinators of ``heaters``, {heater id: account}."""
+    clients = {
+        email: SimpleNamespace(email=email, session=FakeSession(), transport=FakeTransport())
+        for email in set(heaters.values())}
+    coordinators = {heater_id: FakeCoordinator(clients[email]) for heater_id, email in heaters.items()}
+
+    async def async_add_executor_job(target, *args):
+        return target(*args)
+
+    hass = SimpleNamespace(
+        data={DOMAIN: {DATA_CLIENTS: dict(clients), DATA_COORDINATORS: coordinators}},
+        async_add_executor_job=async_add_executor_job)
+    return hass, clients
+
+
+def test_client_released_with_the_last_heater_of_the_account():
+    hass, clients = setup({'H1': 'a@example.com', 'H2': 'a@example.com', 'H3': 'b@example.com'})
+    client = clients['a@example.com']
+
+    asyncio.run(async_remove_coordinator(hass, 'H1'))
+    assert not client.session.closed
+    assert not client.transport.closed
+    assert 'a@example.com' in hass.data[DOMAIN][DATA_CLIENTS]
+
+    asyncio.run(async_remove_coordinator(hass, 'H2'))
+    assert client.session.closed
+    assert client.transport.closed
+    assert set(hass.data[DOMAIN][DATA_CLIENTS]) == {'b@example.com'}
+    assert not clients['b@example.com'].session.closed
+
+
+def test_clients_released_on_shutdown():
+    hass, clients = setup({'H1': 'a@example.com', 'H2': 'b@example.com'})
+    asyncio.run(async_close_clients(hass))
+    assert all(client.session.closed and client.transport.closed for client in clients.values())
@@ -0,0 +1,106 @@
+"""Pending commands overlaid on the state reported by the cloud."""
+import asyncio
+
+import pytest
+
+from custom_components.jollymec import hajolly
+from custom_components.jollymec.hajolly import DeviceState, Status
+
+from .common import FakeClock, FakeCloud, cloud_client
+
+
+class CommandClient(object):
+    """Accepts every command without any network."""
+
+    def __init__(self):
+        self.commands = []
+
+    async def async_ensure_session(self):
+        pass
+
+    async def async_command(self, method, param, heater_id):
+        self.commands.append(method)
+        return {'state': "OK"}
+
+
+def reported(code):
+    return DeviceState.from_message({'deviceStatus': code, 'isDeviceInAlarm': False, 'lastSetPower': 3})
+
+
+@pytest.fixture
+def device():
+    jolly = hajolly.jollymec('user', 'password', 'H1', client=CommandClient())
+    jolly.device.apply_state(reported(0))
+    return jolly.device
+
+
+@pytest.mark.parametrize('status, code', [
+    (Status.OFF, 0), (Status.IGNITION, 1), (Status.ON, 7),
+    (Status.FINAL_CLEANING, 9), (Status.STANDBY, 10), (Status.ALARM, 12),
+])
+def test_status_and_code_stay_consistent(status, code):
+    assert status.code == code
+    state = reported(7)
+    assert state.replace(status=status).status_code == code
+    assert state.replace(status_code=code).status == status
+    assert state.replace(status=None).status_code is None
+
+
+def test_pending_status_overlays_its_code(device):
+    asyncio.run(device.async_turn_on())
+    assert device.pending == ['status']
+    assert device.status == Status.IGNITION
+    assert device.status_translated == 1
+    # Still off at the cloud: the command stays shown
+    device.apply_state(reported(0))
+    assert (device.status, device.status_translated) == (Status.IGNITION, 1)
+    # Confirmed with the code the stove actually reports
+    device.apply_state(reported(3))
+    assert device.pending == []
+    assert (device.status, device.status_translated) == (Status.IGNITION, 3)
+
+
+def test_rollback_restores_the_reported_code(device):
+    asyncio.run(device.async_turn_on())
+    device.rollback()
+    assert (device.status, device.status_translated) == (Status.OFF, 0)
+    assert device.reported == reported(0)
+
+
+STOVE = {'deviceStatus': 7, 'isDeviceInAlarm': False, 'airTemperature': 21.5, 'lastSetPower': 3}
+
+
+def test_unchanged_body_seen_by_another_reader_is_still_parsed():
+    cloud = FakeCloud({'H1': STOVE})
+    client = cloud_client(cloud, FakeClock(), state_max_age=0)
+    first = hajolly.jollymec('user', 'password', 'H1', client=client).device
+    second = hajolly.jollymec('user', 'password', 'H1', client=client).device
+
+    asyncio.run(first.async_update())
+    asyncio.run(second.async_update())
+    assert second.reported == DeviceState.from_message(STOVE)
+    assert cloud.requests.count('get-state') == 2
+
+
+def test_unchanged_body_keeps_the_reported_state():
+    cloud = FakeCloud({'H1': STOVE})
+    client = cloud_client(cloud, FakeClock(), state_max_age=0)
+    device = hajolly.jollymec('user', 'password', 'H1', client=client).device
+    asyncio.run(device.async_update())
+    reported = device.reported
+    asyncio.run(device.async_update())
+    assert device.reported is reported
+
+    cloud.states['H1'] = dict(STOVE, airTemperature=22.0)
+    asyncio.run(device.async_update())
+    assert device.air_temperature == 22.0
+
+
+def test_restored_state_is_replaced_by_the_first_poll():
+    cloud = FakeCloud({'H1': STOVE})
+    client = cloud_client(cloud, FakeClock(), state_max_age=0)
+    asyncio.run(hajolly.jollymec('user', 'password', 'H1', client=client).device.async_update())
+    device = hajolly.jollymec('user', 'password', 'H1', client=client).device
+    device.apply_state(reported(0))
+    asyncio.run(device.async_update())
+    assert device.status == Status.ON
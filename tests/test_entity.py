@@ -0,0 +1,130 @@
+"""State writes of JollyMecEntity, gated by change detection and deadbands."""
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.jollymec.entity import JollyMecEntity
+from homeassistant.helpers.entity import Entity
+
+
+class Probe(JollyMecEntity):
+    """Entity whose state and attributes are set by the test."""
+
+    _deadbands = {'state': 'air_temperature', 'smoke': 'smoke_temperature'}
+    _volatile = frozenset({'last_poll'})
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self.value = 20.0
+        self.attributes = {'smoke': 100.0, 'mode': 'ON', 'last_poll': 0}
+
+    @property
+    def state(self):
+        return self.value
+
+    @property
+    def extra_state_attributes(self):
+        return dict(self.attributes)
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    writes = []
+    monkeypatch.setattr(Entity, 'async_write_ha_state', lambda entity: writes.append(entity._snapshot()))
+    return writes
+
+
+@pytest.fixture
+def entity(writes):
+    coordinator = SimpleNamespace(
+        data=object(), last_update_success=True, stale=False,
+        deadbands={'air_temperature': 0.2, 'smoke_temperature': 5.0})
+    entity = Probe(coordinator)
+    entity._handle_coordinator_update()
+    assert len(writes) == 1
+    return entity
+
+
+def test_identical_update_does_not_write(entity, writes):
+    entity._handle_coordinator_update()
+    assert len(writes) == 1
+
+
+@pytest.mark.parametrize('value, written', [(20.1, False), (19.85, False), (20.25, True), (19.7, True)])
+def test_state_written_once_it_crosses_the_deadband(entity, writes, value, written):
+    entity.value = value
+    entity._handle_coordinator_update()
+    assert len(writes) == 1 + written
+
+
+def test_drift_is_measured_from_the_last_write(entity, writes):
+    for value in (20.1, 20.15, 20.19):
+        entity.value = value
+        entity._handle_coordinator_update()
+    assert len(writes) == 1
+    entity.value = 20.25
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+    # The new reference is 20.25
+    entity.value = 20.4
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+
+
+def test_attribute_deadband(entity, writes):
+    entity.attributes['smoke'] = 104.0
+    entity._handle_coordinator_update()
+    assert len(writes) == 1
+    entity.attributes['smoke'] = 106.0
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+
+
+def test_attributes_without_deadband_always_write(entity, writes):
+    entity.attributes['mode'] = 'Stand-by'
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+
+
+def test_volatile_attribute_alone_does_not_write(entity, writes):
+    entity.attributes['last_poll'] = 1
+    entity._handle_coordinator_update()
+    assert len(writes) == 1
+    # but it goes out with the next write
+    entity.attributes['mode'] = 'OFF'
+    entity._handle_coordinator_update()
+    assert writes[-1]['last_poll'] == 1
+
+
+@pytest.mark.parametrize('change', [
+    {'last_update_success': False},
+    {'data': None},
+])
+def test_availability_flip_always_writes(entity, writes, change):
+    for name, value in change.items():
+        setattr(entity.coordinator, name, value)
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+    assert writes[-1]['available'] is False
+
+
+def test_stale_snapshot_stays_available(entity, writes):
+    entity.coordinator.last_update_success = False
+    entity.coordinator.stale = True
+    entity._handle_coordinator_update()
+    assert len(writes) == 1
+
+
+def test_unknown_value_is_a_change(entity, writes):
+    entity.value = None
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
+    entity.value = 20.05
+    entity._handle_coordinator_update()
+    assert len(writes) == 3
+
+
+def test_new_attribute_is_a_change(entity, writes):
+    entity.attributes['alarm'] = None
+    entity._handle_coordinator_update()
+    assert len(writes) == 2
@@ -0,0 +1,68 @@
+"""Edges found by events.transitions between two reported states."""
+import pytest
+
+from custom_components.jollymec.events import (
+    ALARM_CLEARED,
+    ALARM_RAISED,
+    FINAL_CLEANING,
+    IGNITION_FINISHED,
+    IGNITION_STARTED,
+    STANDBY,
+    event_data,
+    transitions,
+)
+from custom_components.jollymec.hajolly import DeviceState
+
+
+def state(code, alarm=False):
+    return DeviceState.from_message({'deviceStatus': code, 'isDeviceInAlarm': alarm, 'airTemperature': 20})
+
+
+@pytest.mark.parametrize('previous, current, expected', [
+    (state(0), state(1), [IGNITION_STARTED]),
+    (state(1), state(3), []),
+    (state(3), state(7), [IGNITION_FINISHED]),
+    (state(7), state(10), [STANDBY]),
+    (state(10), state(11), []),
+    (state(10), state(9), [FINAL_CLEANING]),
+    (state(9), state(0), []),
+    (state(7), state(12, alarm=True), [ALARM_RAISED]),
+    (state(12, alarm=True), state(0), [ALARM_CLEARED]),
+    # An ignition ending in an alarm
+    (state(5), state(12, alarm=True), [IGNITION_FINISHED, ALARM_RAISED]),
+    # One alarm replaced by another: the old one is cleared first
+    (state(12, alarm=True), state(13, alarm=True), [ALARM_CLEARED, ALARM_RAISED]),
+    # Alarm status without the alarm flag carries no alarm text
+    (state(7), state(12), []),
+])
+def test_edges(previous, current, expected):
+    assert transitions(previous, current) == expected
+
+
+@pytest.mark.parametrize('code, alarm', [(0, False), (1, False), (7, False), (10, False), (9, False), (12, True)])
+def test_repeated_state_fires_nothing(code, alarm):
+    assert transitions(state(code, alarm), state(code, alarm)) == []
+
+
+def test_nothing_without_a_previous_state():
+    assert transitions(None, state(12, alarm=True)) == []
+    assert transitions(state(7), None) == []
+
+
+def test_only_status_and_alarm_matter():
+    assert transitions(state(7), state(7).replace(air_temperature=25.0, set_power=5)) == []
+
+
+def test_event_data_carries_the_alarm_text():
+    raised = event_data('H1', ALARM_RAISED, state(7), state(12, alarm=True))
+    assert raised == {
+        'heater_id': 'H1',
+        'type': ALARM_RAISED,
+        'status': 'Alarme',
+        'previous_status': 'ON',
+        'status_code': 12,
+        'alarm': 'Flamme en panne',
+    }
+    cleared = event_data('H1', ALARM_CLEARED, state(12, alarm=True), state(0))
+    assert cleared['alarm'] == 'Flamme en panne'
+    assert cleared['status'] == 'OFF'
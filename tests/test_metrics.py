@@ -0,0 +1,58 @@
+"""Latency histograms and counters of ClientMetrics."""
+import pytest
+
+from custom_components.jollymec.metrics import RECENT_SAMPLES, ClientMetrics, LatencyHistogram
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.2, 1.0, 1.5):
+        histogram.observe(seconds)
+    assert histogram.as_dict()['buckets'] == {'<=0.1': 2, '<=1.0': 2, '>1.0': 1}
+
+
+def test_summary():
+    histogram = LatencyHistogram()
+    assert histogram.as_dict()['mean'] is None
+    assert histogram.percentile(0.5) is None
+    for seconds in (0.3, 0.1, 0.2):
+        histogram.observe(seconds)
+    summary = histogram.as_dict()
+    assert summary['count'] == 3
+    assert summary['mean'] == pytest.approx(0.2)
+    assert summary['max'] == 0.3
+    assert summary['p50'] == 0.2
+    assert summary['p99'] == 0.3
+
+
+def test_percentiles_cover_the_recent_samples_only():
+    histogram = LatencyHistogram()
+    for _ in range(RECENT_SAMPLES):
+        histogram.observe(10.0)
+    for _ in range(RECENT_SAMPLES):
+        histogram.observe(0.1)
+    assert histogram.percentile(0.99) == 0.1
+    # Totals still count everything
+    assert histogram.count == 2 * RECENT_SAMPLES
+    assert histogram.max == 10.0
+
+
+def test_client_metrics():
+    metrics = ClientMetrics()
+    metrics.observe('get-state', 0.2)
+    metrics.observe('get-state', 0.4)
+    metrics.observe('login', 1.0)
+    metrics.increment('retries')
+    metrics.increment('retries')
+    metrics.error('comm_error')
+    metrics.error('network', "ServerTimeoutError()")
+    metrics.success('get-state')
+
+    data = metrics.as_dict()
+    assert data['latency']['get-state']['count'] == 2
+    assert data['latency']['login']['count'] == 1
+    assert data['counters'] == {'retries': 2}
+    assert data['errors'] == {'comm_error': 1, 'network': 1}
+    assert data['last_error']['kind'] == 'network'
+    assert data['last_error']['message'] == "ServerTimeoutError()"
+    assert set(data['last_success']) == {'get-state'}
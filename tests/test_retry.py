@@ -0,0 +1,254 @@
+"""RetryPolicy, CircuitBreaker and the retry loop of JollyMecClient.async_post."""
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+
+from custom_components.jollymec import hajolly
+from custom_components.jollymec.retry import (
+    FAILURE_THRESHOLD,
+    RETRIES,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    RetryPolicy,
+)
+from custom_components.jollymec.transport import TransportResponse
+
+from .common import FakeClock, FakeCloud, cloud_client, run_virtual
+
+OK_REPLY = (TransportResponse(200, 'application/json', []), b'{"status": 0, "message": {}}')
+ERROR_PAGE = (
+    TransportResponse(200, 'text/html', []),
+    "<title>Problèmes de communication</title>".encode('utf-8'),
+)
+
+
+def test_delay_is_exponential_with_half_jitter():
+    low = RetryPolicy(base_delay=2.0, max_delay=30.0, rand=lambda: 0.0)
+    high = RetryPolicy(base_delay=2.0, max_delay=30.0, rand=lambda: 1.0)
+    assert [low.delay(attempt) for attempt in range(6)] == [1.0, 2.0, 4.0, 8.0, 15.0, 15.0]
+    assert [high.delay(attempt) for attempt in range(6)] == [2.0, 4.0, 8.0, 16.0, 30.0, 30.0]
+
+
+def test_sleep_respects_the_deadline():
+    clock = FakeClock()
+    policy = RetryPolicy(base_delay=2.0, sleep=clock.sleep, rand=lambda: 1.0, clock=clock)
+
+    assert asyncio.run(policy.async_sleep(0, deadline=clock() + 10)) is True
+    assert clock.sleeps == [2.0]
+    # 4 s would end exactly at the deadline: refused without sleeping
+    assert asyncio.run(policy.async_sleep(1, deadline=clock() + 4)) is False
+    assert clock.sleeps == [2.0]
+    assert asyncio.run(policy.async_sleep(3)) is True
+    assert clock.sleeps == [2.0, 16.0]
+
+
+def test_breaker_threshold_exceeds_the_retries():
+    assert FAILURE_THRESHOLD == RETRIES + 1
+
+
+def test_breaker_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_lets_one_trial_through_after_the_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock)
+    breaker.record_failure()
+    clock.advance(59)
+    assert breaker.retry_after == pytest.approx(1.0)
+    assert not breaker.allow_request()
+    clock.advance(1)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trials_double_the_timeout_up_to_the_maximum():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, max_reset_timeout=200.0, clock=clock)
+    breaker.record_failure()
+    timeouts = []
+    for _ in range(4):
+        timeouts.append(breaker.retry_after)
+        clock.advance(breaker.retry_after)
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert timeouts == [60.0, 120.0, 200.0, 200.0]
+
+    # Success starts over from the base timeout
+    clock.advance(breaker.retry_after)
+    assert breaker.allow_request()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.retry_after == 60.0
+
+
+def test_lost_trial_does_not_block_the_breaker_forever():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock)
+    breaker.record_failure()
+    clock.advance(60)
+    assert breaker.allow_request()
+    # The trial never reports back
+    clock.advance(60)
+    assert not breaker.allow_request()
+    clock.advance(1)
+    assert breaker.allow_request()
+
+
+class ScriptedTransport(object):
+    """Plays a list of replies; exceptions in it are raised instead."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def async_post(self, session, url, data, headers):
+        self.calls += 1
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def make_client(replies, clock, **kwargs):
+    session = SimpleNamespace(closed=False, cookie_jar=[])
+    transport = ScriptedTransport(replies)
+    client = hajolly.JollyMecClient(
+        session, 'user', 'password', transport=transport, clock=clock,
+        retry_policy=RetryPolicy(sleep=clock.sleep, rand=lambda: 0.0, clock=clock),
+        breaker=kwargs.pop('breaker', CircuitBreaker(clock=clock)), **kwargs)
+    return client, transport
+
+
+def post(client):
+    return asyncio.run(client.async_post('http://cloud/', {}, {}, 'get-state'))
+
+
+def test_network_errors_are_retried_with_backoff():
+    clock = FakeClock()
+    timeout = aiohttp.ServerTimeoutError("read timeout")
+    client, transport = make_client([timeout, aiohttp.ClientConnectionError(), OK_REPLY], clock)
+    assert post(client) == OK_REPLY
+    assert transport.calls == 3
+    assert clock.sleeps == [1.0, 2.0]
+    assert client.metrics.counters['retries'] == 2
+    assert client.breaker.state == STATE_CLOSED
+
+
+def test_error_pages_are_retried_with_backoff():
+    clock = FakeClock()
+    client, transport = make_client([ERROR_PAGE, ERROR_PAGE, OK_REPLY], clock)
+    assert post(client) == OK_REPLY
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_exhausted_network_retries_raise_connection_error():
+    clock = FakeClock()
+    timeout = aiohttp.ServerTimeoutError("read timeout")
+    client, transport = make_client(
+        [timeout], clock, breaker=CircuitBreaker(failure_threshold=100, clock=clock))
+    with pytest.raises(hajolly.ConnectionError) as info:
+        post(client)
+    assert not isinstance(info.value, hajolly.CircuitOpenError)
+    assert info.value.__cause__ is timeout
+    assert transport.calls == RETRIES + 1
+
+
+def test_default_breaker_lets_a_request_use_all_its_retries():
+    clock = FakeClock()
+    client, transport = make_client([ERROR_PAGE], clock, breaker=None)
+    assert client.breaker.failure_threshold == RETRIES + 1
+    with pytest.raises(hajolly.CircuitOpenError):
+        post(client)
+    assert transport.calls == RETRIES + 1
+    assert len(clock.sleeps) == RETRIES
+    # The next request is refused without touching the network
+    with pytest.raises(hajolly.CircuitOpenError):
+        post(client)
+    assert transport.calls == RETRIES + 1
+
+
+def test_retries_stop_at_the_deadline_of_the_client_clock():
+    clock = FakeClock()
+    client, transport = make_client([ERROR_PAGE], clock, operation_timeout=5.0)
+    with pytest.raises(hajolly.DeadlineExceeded):
+        post(client)
+    # 1 s then 2 s fit in the budget, 4 s more would not
+    assert clock.sleeps == [1.0, 2.0]
+    assert transport.calls == 3
+
+
+def test_deadline_block_shortens_the_budget():
+    clock = FakeClock()
+    client, transport = make_client([ERROR_PAGE], clock)
+
+    async def run():
+        with hajolly.deadline(2.5, clock):
+            await client.async_post('http://cloud/', {}, {}, 'get-state')
+
+    with pytest.raises(hajolly.DeadlineExceeded):
+        asyncio.run(run())
+    assert clock.sleeps == [1.0]
+
+
+def test_waiting_for_a_slot_is_not_a_breaker_failure():
+    clock = FakeClock(0.0)
+    cloud = FakeCloud(latency=10.0)
+    client = cloud_client(cloud, clock, max_concurrency=1)
+    client.breaker = CircuitBreaker(failure_threshold=1, clock=clock)
+    form = {'method': 'get-state', 'params': '1', 'device': 'H1'}
+
+    async def waiting():
+        with pytest.raises(hajolly.DeadlineExceeded):
+            with hajolly.deadline(2.0, clock):
+                await client.async_post('http://cloud/', form, {}, 'get-state')
+        # Before the request holding the slot reports back
+        return client.breaker.state
+
+    async def scenario():
+        return await asyncio.gather(client.async_post('http://cloud/', form, {}, 'get-state'), waiting())
+
+    (first, state), _ = run_virtual(scenario(), clock=clock)
+    assert state == STATE_CLOSED
+    assert first[0].status == 200
+    assert cloud.requests == ['get-state']
+    assert client.metrics.errors['deadline'] == 1
+    assert 'network' not in client.metrics.errors
+
+
+def test_open_breaker_refuses_without_waiting_for_a_slot():
+    clock = FakeClock(0.0)
+    cloud = FakeCloud(latency=10.0)
+    client = cloud_client(cloud, clock, max_concurrency=1)
+    form = {'method': 'get-state', 'params': '1', 'device': 'H1'}
+
+    async def scenario():
+        busy = asyncio.ensure_future(client.async_post('http://cloud/', form, {}, 'get-state'))
+        await asyncio.sleep(1.0)
+        client.breaker._open(60.0)
+        with pytest.raises(hajolly.CircuitOpenError):
+            await client.async_post('http://cloud/', form, {}, 'get-state')
+        refused_at = asyncio.get_running_loop().time()
+        await busy
+        return refused_at
+
+    refused_at, _ = run_virtual(scenario(), clock=clock)
+    assert refused_at == 1.0
@@ -0,0 +1,78 @@
+"""PollingScheduler: fast and idle intervals, the maintenance window and the breaker."""
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from custom_components.jollymec.coordinator import PollingScheduler
+from custom_components.jollymec.hajolly import Status
+
+TZ = timezone(timedelta(hours=1))
+DAY = datetime(2024, 1, 15, tzinfo=TZ)
+
+
+def at(hours, minutes=0, seconds=0, day=DAY):
+    return day + timedelta(hours=hours, minutes=minutes, seconds=seconds)
+
+
+@pytest.fixture
+def scheduler():
+    return PollingScheduler(
+        interval=timedelta(minutes=1),
+        fast_interval=timedelta(seconds=15),
+        idle_interval=timedelta(minutes=5),
+        maintenance_start=time(2, 45),
+        maintenance_duration=timedelta(minutes=20),
+    )
+
+
+@pytest.mark.parametrize('status, expected', [
+    (Status.IGNITION, timedelta(seconds=15)),
+    (Status.FINAL_CLEANING, timedelta(seconds=15)),
+    (Status.ON, timedelta(minutes=1)),
+    (Status.ALARM, timedelta(minutes=1)),
+    (None, timedelta(minutes=1)),
+    (Status.OFF, timedelta(minutes=5)),
+    (Status.STANDBY, timedelta(minutes=5)),
+])
+def test_interval_follows_the_status(scheduler, status, expected):
+    assert scheduler.next_interval(status, at(12)) == expected
+
+
+def test_no_poll_during_the_maintenance_window(scheduler):
+    assert scheduler.maintenance_remaining(at(2, 44, 59)) is None
+    assert scheduler.maintenance_remaining(at(2, 45)) == timedelta(minutes=20)
+    assert scheduler.next_interval(Status.IGNITION, at(2, 50)) == timedelta(minutes=15)
+    assert scheduler.maintenance_remaining(at(3, 5)) is None
+
+
+def test_window_running_past_midnight(scheduler):
+    scheduler.maintenance_start = time(23, 50)
+    assert scheduler.maintenance_remaining(at(23, 55)) == timedelta(minutes=15)
+    assert scheduler.maintenance_remaining(at(0, 5, day=DAY + timedelta(days=1))) == timedelta(minutes=5)
+    assert scheduler.maintenance_remaining(at(0, 10, day=DAY + timedelta(days=1))) is None
+
+
+def test_idle_poll_does_not_skip_the_poll_after_the_window(scheduler):
+    # Five minutes from 02:42 would land inside the window
+    assert scheduler.next_interval(Status.OFF, at(2, 42)) == timedelta(minutes=3)
+    # Never shorter than the fast interval
+    assert scheduler.next_interval(Status.OFF, at(2, 44, 55)) == timedelta(seconds=15)
+    # After the window, the next one is tomorrow
+    assert scheduler.next_interval(Status.OFF, at(3, 5)) == timedelta(minutes=5)
+
+
+@pytest.mark.parametrize('duration, start', [(timedelta(0), time(2, 45)), (timedelta(minutes=20), None)])
+def test_disabled_window(scheduler, duration, start):
+    scheduler.maintenance_duration = duration
+    scheduler.maintenance_start = start
+    assert scheduler.maintenance_remaining(at(2, 50)) is None
+    assert scheduler.next_interval(Status.OFF, at(2, 42)) == timedelta(minutes=5)
+
+
+def test_refused_poll_waits_for_the_breaker_only(scheduler):
+    assert scheduler.next_interval(Status.OFF, at(12), retry_after=40) == timedelta(seconds=40)
+    assert scheduler.next_interval(Status.ON, at(12), retry_after=600) == timedelta(minutes=1)
+    # A breaker letting requests through again is polled at the fast interval
+    assert scheduler.next_interval(Status.ON, at(12), retry_after=0) == timedelta(seconds=15)
+    # The maintenance window still wins
+    assert scheduler.next_interval(Status.ON, at(2, 50), retry_after=0) == timedelta(minutes=15)
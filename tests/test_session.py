@@ -0,0 +1,92 @@
+"""Logins of JollyMecClient: one per expired session, whatever the number of callers."""
+import asyncio
+
+import pytest
+
+from custom_components.jollymec import hajolly
+
+from .common import FakeClock, FakeCloud, cloud_client, run_virtual
+
+STOVE = {'deviceStatus': 7, 'isDeviceInAlarm': False}
+HEATERS = ('H1', 'H2', 'H3')
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(0.0)
+
+
+@pytest.fixture
+def cloud():
+    return FakeCloud({heater: STOVE for heater in HEATERS}, latency=0.5)
+
+
+def test_concurrent_first_calls_log_in_once(clock, cloud):
+    client = cloud_client(cloud, clock)
+
+    async def scenario():
+        await asyncio.gather(*(client.async_ensure_session() for _ in range(3)))
+
+    run_virtual(scenario(), clock=clock)
+    assert cloud.logins == 1
+
+
+def test_callers_of_an_expired_session_share_one_login(clock, cloud):
+    client = cloud_client(cloud, clock)
+
+    async def scenario():
+        await client.async_ensure_session()
+        cloud.expire_session()
+        return await asyncio.gather(*(client.async_heater_on(heater) for heater in HEATERS))
+
+    results, _ = run_virtual(scenario(), clock=clock)
+    assert [result['state'] for result in results] == ["OK"] * 3
+    assert cloud.logins == 2
+    # Each command was sent, refused, then replayed once
+    assert cloud.requests.count('heater-on') == 6
+    assert client.metrics.counters['replays'] == 3
+
+
+def test_stale_generation_does_not_log_in_again(clock, cloud):
+    client = cloud_client(cloud, clock)
+
+    async def scenario():
+        generation = client._generation
+        await client._async_relogin(generation)
+        # A caller that saw the same session fail, after the login it shares
+        await client._async_relogin(generation)
+        await client._async_relogin(client._generation)
+
+    run_virtual(scenario(), clock=clock)
+    assert cloud.logins == 2
+
+
+def test_session_expiring_again_after_the_replay_is_not_retried(clock, cloud):
+    client = cloud_client(cloud, clock)
+
+    class ExpiringCloud(FakeCloud):
+        """Forgets the session right after every login."""
+
+        async def async_post(self, session, url, data, headers):
+            reply = await super().async_post(session, url, data, headers)
+            self.expire_session()
+            return reply
+
+    client.transport = ExpiringCloud({'H1': STOVE})
+    result, _ = run_virtual(client.async_heater_on('H1'), clock=clock)
+    assert result['state'] == "NOT LOGGED IN"
+    assert client.transport.logins == 1
+
+
+def test_refused_login_raises_and_keeps_the_generation(clock, cloud):
+    client = cloud_client(cloud, clock)
+    cloud.login_status = 403
+    with pytest.raises(hajolly.UnauthorizedError):
+        run_virtual(client.async_ensure_session(), clock=clock)
+    assert client._generation == 0
+
+    # The next caller tries again
+    cloud.login_status = 200
+    run_virtual(client.async_ensure_session(), clock=clock)
+    assert cloud.logins == 1
+    assert client._generation == 1
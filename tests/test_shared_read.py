@@ -0,0 +1,122 @@
+"""Reads of a heater shared between concurrent callers, on a virtual-time loop."""
+import asyncio
+
+import pytest
+
+from custom_components.jollymec import hajolly
+
+from .common import FakeClock, FakeCloud, cloud_client, run_virtual
+
+STOVE = {'deviceStatus': 7, 'isDeviceInAlarm': False}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(0.0)
+
+
+@pytest.fixture
+def cloud():
+    return FakeCloud({'H1': STOVE, 'H2': STOVE}, latency=2.0)
+
+
+@pytest.fixture
+def client(cloud, clock):
+    return cloud_client(cloud, clock, state_max_age=5.0)
+
+
+def reads(cloud):
+    return cloud.requests.count('get-state')
+
+
+def run(client, clock, scenario):
+    async def logged_in():
+        await client.async_ensure_session()
+        return await scenario()
+
+    return run_virtual(logged_in(), clock=clock)[0]
+
+
+def test_concurrent_reads_share_one_request(client, cloud, clock):
+    async def scenario():
+        return await asyncio.gather(
+            client.async_get_state('H1'), client.async_get_state('H1'), client.async_get_state('H2'))
+
+    results = run(client, clock, scenario)
+    assert [result['state'] for result in results] == ["OK"] * 3
+    assert results[0] is results[1]
+    assert reads(cloud) == 2
+    assert client.metrics.counters['shared_reads'] == 1
+
+
+def test_read_is_served_again_until_the_window_expires(client, cloud, clock):
+    async def scenario():
+        await client.async_get_state('H1')
+        await asyncio.sleep(4.9)
+        await client.async_get_state('H1')
+        assert reads(cloud) == 1
+        await asyncio.sleep(0.2)
+        await client.async_get_state('H1')
+
+    run(client, clock, scenario)
+    assert reads(cloud) == 2
+    assert client.metrics.counters['fresh_reads'] == 1
+
+
+def test_command_drops_the_fresh_read(client, cloud, clock):
+    async def scenario():
+        await client.async_get_state('H1')
+        await client.async_heater_on('H2')
+        await client.async_get_state('H1')
+        await client.async_heater_on('H1')
+        await client.async_get_state('H1')
+
+    run(client, clock, scenario)
+    assert reads(cloud) == 2
+
+
+def test_cancelled_caller_leaves_the_read_to_the_others(client, cloud, clock):
+    async def scenario():
+        first = asyncio.ensure_future(client.async_get_state('H1'))
+        second = asyncio.ensure_future(client.async_get_state('H1'))
+        await asyncio.sleep(1.0)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        return result
+
+    assert run(client, clock, scenario)['state'] == "OK"
+    assert reads(cloud) == 1
+
+
+def test_short_deadline_of_the_first_caller_does_not_end_the_read(client, cloud, clock):
+    async def hurried():
+        with hajolly.deadline(1.0, clock):
+            return await client.async_get_state('H1')
+
+    async def patient():
+        with hajolly.deadline(10.0, clock):
+            return await client.async_get_state('H1')
+
+    async def scenario():
+        return await asyncio.gather(hurried(), patient(), return_exceptions=True)
+
+    first, second = run(client, clock, scenario)
+    assert isinstance(first, hajolly.DeadlineExceeded)
+    assert second['state'] == "OK"
+    assert reads(cloud) == 1
+
+
+def test_waiter_gives_up_at_its_own_deadline(client, cloud, clock):
+    async def scenario():
+        with pytest.raises(hajolly.DeadlineExceeded):
+            with hajolly.deadline(1.5, clock):
+                await client.async_get_state('H1')
+        # The read carries on without its waiter and is served afterwards
+        await asyncio.sleep(1.0)
+        return await client.async_get_state('H1')
+
+    assert run(client, clock, scenario)['state'] == "OK"
+    assert client.metrics.errors['deadline'] == 1
+    assert client.metrics.counters['fresh_reads'] == 1
+    assert reads(cloud) == 1
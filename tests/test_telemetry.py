@@ -0,0 +1,158 @@
+"""TelemetryBuffer against a brute-force recomputation over the same window."""
+import random
+
+import pytest
+
+from custom_components.jollymec.telemetry import CHANNELS, TelemetryBuffer
+
+
+def reference(samples, name):
+    """Stats of ``name`` over ``samples`` (timestamp, values), from scratch."""
+    origin = samples[0][0] if samples else 0.0
+    points = [(t - origin, values[name]) for t, values in samples if values.get(name) is not None]
+    stats = {'samples': len(points), 'min': None, 'max': None, 'mean': None, 'slope': None}
+    if not points:
+        return stats
+    ys = [y for _, y in points]
+    stats.update(min=min(ys), max=max(ys), mean=sum(ys) / len(ys))
+    if len(points) >= 2:
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_y = stats['mean']
+        variance = sum((t - mean_t) ** 2 for t, _ in points)
+        if variance > 0:
+            stats['slope'] = sum((t - mean_t) * (y - mean_y) for t, y in points) / variance * 3600
+    return stats
+
+
+def absolute_times(buffer):
+    data = buffer.as_dict()
+    return [data['origin'] + t for t in data['times']]
+
+
+def assert_matches(buffer, window):
+    assert len(buffer) == len(window)
+    stats = buffer.stats()
+    for name in CHANNELS:
+        expected = reference(window, name)
+        actual = stats[name]
+        assert actual['samples'] == expected['samples'], name
+        assert actual['min'] == expected['min'], name
+        assert actual['max'] == expected['max'], name
+        for key in ('mean', 'slope'):
+            if expected[key] is None:
+                assert actual[key] is None, (name, key)
+            else:
+                assert actual[key] == pytest.approx(expected[key], rel=1e-6, abs=1e-6), (name, key)
+
+
+def random_samples(rng, count, start=1_700_000_000.0):
+    t = start
+    for _ in range(count):
+        t += rng.uniform(10, 120)
+        values = {}
+        for name in CHANNELS:
+            # Unknown values and repeated ones stress the monotonic queues
+            roll = rng.random()
+            if roll < 0.1:
+                values[name] = None
+            elif roll < 0.3:
+                values[name] = 20.0
+            else:
+                values[name] = round(rng.uniform(-5, 300), 1)
+        yield t, values
+
+
+@pytest.mark.parametrize('capacity', [1, 2, 3, 7, 16])
+def test_rolling_stats_match_reference(capacity):
+    rng = random.Random(capacity)
+    buffer = TelemetryBuffer(capacity)
+    window = []
+    # Several laps, so removals and the per-lap rebuild are both exercised
+    for t, values in random_samples(rng, capacity * 5 + 3):
+        buffer.append(t, **values)
+        window = (window + [(t, values)])[-capacity:]
+        assert_matches(buffer, window)
+
+
+def test_long_run_keeps_its_precision():
+    # Weeks of one-minute polls: the per-lap rebuild stops rounding drift
+    rng = random.Random(42)
+    buffer = TelemetryBuffer(240)
+    samples = list(random_samples(rng, 20000))
+    for t, values in samples:
+        buffer.append(t, **values)
+    assert_matches(buffer, samples[-240:])
+
+
+def test_empty_buffer():
+    buffer = TelemetryBuffer(4)
+    assert len(buffer) == 0
+    assert buffer.span == 0.0
+    for stats in buffer.stats().values():
+        assert stats == {'min': None, 'max': None, 'mean': None, 'slope': None, 'samples': 0}
+
+
+def test_slope_needs_two_distinct_times():
+    buffer = TelemetryBuffer(4)
+    buffer.append(100.0, air_temperature=20.0)
+    assert buffer.channel('air_temperature').slope is None
+    buffer.append(100.0, air_temperature=21.0)
+    assert buffer.channel('air_temperature').slope is None
+    buffer.append(3700.0, air_temperature=22.0)
+    assert buffer.channel('air_temperature').slope == pytest.approx(
+        reference([(100.0, {'air_temperature': 20.0}), (100.0, {'air_temperature': 21.0}),
+                   (3700.0, {'air_temperature': 22.0})], 'air_temperature')['slope'])
+
+
+def test_minimum_leaves_with_its_sample():
+    buffer = TelemetryBuffer(3)
+    for t, value in enumerate([5.0, 1.0, 4.0, 3.0, 2.0]):
+        buffer.append(float(t), air_temperature=value)
+    # 5 and 1 have been pushed out by 3 and 2
+    assert buffer.channel('air_temperature').min == 2.0
+    assert buffer.channel('air_temperature').max == 4.0
+
+
+def test_span_follows_the_window():
+    buffer = TelemetryBuffer(3)
+    for t in (0.0, 60.0, 120.0, 300.0):
+        buffer.append(1000.0 + t, air_temperature=20.0)
+    assert buffer.span == 240.0
+
+
+@pytest.mark.parametrize('count', [0, 5, 9, 20])
+def test_round_trip_keeps_window_and_stats(count):
+    rng = random.Random(count)
+    samples = list(random_samples(rng, count))
+    buffer = TelemetryBuffer(9)
+    for t, values in samples:
+        buffer.append(t, **values)
+
+    restored = TelemetryBuffer.from_dict(buffer.as_dict(), capacity=9)
+    # The restored buffer counts time from its oldest sample
+    assert absolute_times(restored) == pytest.approx(absolute_times(buffer))
+    assert restored.as_dict()['values'] == buffer.as_dict()['values']
+    assert_matches(restored, samples[-9:])
+
+
+def test_restoring_into_a_smaller_buffer_keeps_the_newest_samples():
+    rng = random.Random(1)
+    samples = list(random_samples(rng, 12))
+    buffer = TelemetryBuffer(12)
+    for t, values in samples:
+        buffer.append(t, **values)
+
+    restored = TelemetryBuffer.from_dict(buffer.as_dict(), capacity=5)
+    assert_matches(restored, samples[-5:])
+
+
+def test_on_sample_called_per_append_but_not_on_restore():
+    calls = []
+    buffer = TelemetryBuffer(3)
+    buffer.on_sample = lambda: calls.append(len(buffer))
+    for t in range(4):
+        buffer.append(float(t), real_power=3)
+    assert calls == [1, 2, 3, 3]
+
+    restored = TelemetryBuffer.from_dict(buffer.as_dict(), capacity=3)
+    assert restored.on_sample is None
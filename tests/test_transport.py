@@ -0,0 +1,82 @@
+"""Recording and replaying cloud traffic."""
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from custom_components.jollymec.transport import (
+    REDACTED,
+    RecordingTransport,
+    ReplayTransport,
+    TransportResponse,
+)
+
+LOGIN_FORM = {'login[username]': 'someone@example.com', 'login[password]': 'secret'}
+LOGIN_PAGE = b'<html>Welcome someone@example.com</html>'
+STATE_FORM = {'method': 'get-state', 'params': '1', 'device': 'H1'}
+STATE_BODY = json.dumps({'status': 0, 'message': {'deviceStatus': 7, 'airTemperature': 21.5}}).encode('utf-8')
+
+
+class CannedTransport(object):
+
+    async def async_post(self, session, url, data, headers):
+        if 'method' in data:
+            return TransportResponse(200, 'application/json', []), STATE_BODY
+        return TransportResponse(200, 'text/html', ['PHPSESSID']), LOGIN_PAGE
+
+
+def record(path, exchanges):
+    recorder = RecordingTransport(CannedTransport(), str(path))
+
+    async def run():
+        for url, form in exchanges:
+            await recorder.async_post(None, url, form, {})
+
+    asyncio.run(run())
+    recorder.close()
+
+
+@pytest.mark.parametrize('name', ['traffic.jsonl', 'traffic.jsonl.gz'])
+def test_recording_replays_the_same_replies(tmp_path, name):
+    path = tmp_path / name
+    record(path, [('http://cloud/fr/login/', LOGIN_FORM)] + [('http://cloud/fr/ajax/', STATE_FORM)] * 3)
+    replay = ReplayTransport(str(path)).load()
+
+    async def run():
+        return await replay.async_post(None, 'http://cloud/fr/ajax/', STATE_FORM, {})
+
+    response, body = asyncio.run(run())
+    assert body == STATE_BODY
+    assert response.status == 200
+    assert replay.heaters == ['H1']
+
+
+def test_credentials_and_login_page_are_redacted(tmp_path):
+    path = tmp_path / 'traffic.jsonl'
+    record(path, [('http://cloud/fr/login/', LOGIN_FORM)])
+    text = path.read_text(encoding='utf-8')
+    assert 'someone@example.com' not in text
+    assert 'secret' not in text
+    line = json.loads(text)
+    assert line['body'] == REDACTED
+    assert line['cookies'] == ['PHPSESSID']
+
+
+def test_compressed_recording_is_one_stream(tmp_path):
+    path = tmp_path / 'traffic.jsonl.gz'
+    record(path, [('http://cloud/fr/ajax/', STATE_FORM)] * 200)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 200
+    # One gzip member per line would cost a header and a trailer each
+    single = len(gzip.compress((lines[0] + '\n').encode('utf-8')))
+    assert path.stat().st_size < 3 * single
+
+
+def test_recording_appends_across_runs(tmp_path):
+    path = tmp_path / 'traffic.jsonl.gz'
+    record(path, [('http://cloud/fr/ajax/', STATE_FORM)] * 2)
+    record(path, [('http://cloud/fr/ajax/', STATE_FORM)] * 3)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 5
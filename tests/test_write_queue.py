@@ -0,0 +1,105 @@
+"""Debouncing and merging of ParameterWriteQueue, on a virtual-time loop."""
+import asyncio
+
+import pytest
+
+from custom_components.jollymec import hajolly
+
+from .common import run_virtual
+
+
+class RecordingClient(object):
+    """Records the parameters written and when; ``fail`` makes the next write fail."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.writes = []
+        self.sessions = 0
+        self.fail = None
+
+    async def async_ensure_session(self):
+        self.sessions += 1
+
+    async def async_write_parameters(self, heater_id, param):
+        loop = asyncio.get_running_loop()
+        self.writes.append((loop.time(), heater_id, param))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail is not None:
+            state, self.fail = self.fail, None
+            return {'state': state}
+        return {'state': "OK"}
+
+
+def test_writes_within_the_delay_are_merged():
+    client = RecordingClient()
+    queue = hajolly.ParameterWriteQueue(client, 'H1', delay=1.0)
+
+    async def scenario():
+        async def later(delay, name, value):
+            await asyncio.sleep(delay)
+            return await queue.async_write(name, value)
+
+        return await asyncio.gather(
+            later(0.0, 'set-power', 2),
+            later(0.5, 'set-air-temperature', 20),
+            later(0.9, 'set-power', 4),
+        )
+
+    results, end = run_virtual(scenario())
+    assert results == [True, True, True]
+    # One flush, 1 s after the last write, with the last value of each parameter
+    assert client.writes == [(1.9, 'H1', 'set-power=4'), (1.9, 'H1', 'set-air-temperature=20')]
+    assert client.sessions == 1
+    assert end == pytest.approx(1.9)
+
+
+def test_writes_further_apart_are_sent_separately():
+    client = RecordingClient()
+    queue = hajolly.ParameterWriteQueue(client, 'H1', delay=1.0)
+
+    async def scenario():
+        await queue.async_write('set-power', 2)
+        await asyncio.sleep(0.5)
+        await queue.async_write('set-power', 3)
+
+    run_virtual(scenario())
+    assert client.writes == [(1.0, 'H1', 'set-power=2'), (2.5, 'H1', 'set-power=3')]
+
+
+def test_flushes_stay_in_order_while_the_cloud_is_slow():
+    client = RecordingClient(latency=5.0)
+    queue = hajolly.ParameterWriteQueue(client, 'H1', delay=1.0)
+
+    async def scenario():
+        first = asyncio.ensure_future(queue.async_write('set-power', 2))
+        # Starts flushing at 1 s and holds the cloud until 6 s
+        await asyncio.sleep(1.5)
+        second = asyncio.ensure_future(queue.async_write('set-power', 5))
+        await asyncio.gather(first, second)
+
+    run_virtual(scenario())
+    assert client.writes == [(1.0, 'H1', 'set-power=2'), (6.0, 'H1', 'set-power=5')]
+
+
+def test_a_failed_flush_fails_every_write_it_carried():
+    client = RecordingClient()
+    client.fail = "GET STATE STATUS NOT OK"
+    queue = hajolly.ParameterWriteQueue(client, 'H1', delay=1.0)
+
+    async def scenario():
+        results = await asyncio.gather(
+            queue.async_write('set-power', 2),
+            queue.async_write('set-air-temperature', 21),
+            return_exceptions=True,
+        )
+        # The queue is usable again afterwards
+        results.append(await queue.async_write('set-power', 3))
+        return results
+
+    results, _ = run_virtual(scenario())
+    assert isinstance(results[0], hajolly.ConnectionError)
+    assert results[1] is results[0]
+    assert results[2] is True
+    # The flush stopped at the failed parameter
+    assert [param for _, _, param in client.writes] == ['set-power=2', 'set-power=3']